@@ -3,7 +3,7 @@ CREATE DATABASE IF NOT EXISTS ECHO;
 USE ECHO;
 
 -- Drop tables in reverse order of creation
-DROP TABLE IF EXISTS `post_views`, `post_categories`, `post_likes`, `bookmarks`, `collections`, `follows`, `comments`, `categories`, `posts`, `users`;
+DROP TABLE IF EXISTS `user_recommendations`, `post_views`, `post_categories`, `post_likes`, `bookmarks`, `collections`, `follows`, `comments`, `categories`, `posts`, `users`;
 
 -- =================================================================
 --                          TABLES
@@ -28,7 +28,14 @@ CREATE TABLE `posts` (
   `likes_count` INT NOT NULL DEFAULT 0,
   `views_count` INT NOT NULL DEFAULT 0,
   `comments_count` INT NOT NULL DEFAULT 0,
-  INDEX `idx_user_id` (`user_id`),
+  -- Set by sp_delete_post; the purger (backend/app/purge.py) removes the row later.
+  -- Every read procedure filters on `deleted_at IS NULL`.
+  `deleted_at` TIMESTAMP NULL DEFAULT NULL,
+  -- (user_id, deleted_at, created_at) serves the FK and "a user's live posts, newest first"
+  INDEX `idx_user_created` (`user_id`, `deleted_at`, `created_at`),
+  -- Lets the global "latest posts" list read the newest live rows without a filesort,
+  -- and the purger find soft-deleted posts
+  INDEX `idx_deleted_created` (`deleted_at`, `created_at`),
   FOREIGN KEY (`user_id`) REFERENCES `users`(`user_id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -41,7 +48,8 @@ CREATE TABLE `comments` (
   `post_id` INT NOT NULL,
   `parent_id` INT DEFAULT NULL,
   INDEX `idx_user_id` (`user_id`),
-  INDEX `idx_post_id` (`post_id`),
+  -- (post_id, created_at) returns a post's comments already in order
+  INDEX `idx_post_created` (`post_id`, `created_at`),
   FOREIGN KEY (`user_id`) REFERENCES `users`(`user_id`) ON DELETE CASCADE,
   FOREIGN KEY (`post_id`) REFERENCES `posts`(`post_id`) ON DELETE CASCADE,
   FOREIGN KEY (`parent_id`) REFERENCES `comments`(`comment_id`) ON DELETE CASCADE
@@ -50,7 +58,10 @@ CREATE TABLE `comments` (
 -- Categories Table
 CREATE TABLE `categories` (
   `category_id` INT AUTO_INCREMENT PRIMARY KEY,
-  `name` VARCHAR(100) NOT NULL UNIQUE
+  `name` VARCHAR(100) NOT NULL UNIQUE,
+  -- Kept up to date by the post_categories triggers, so ranking tags is an indexed read
+  `post_count` INT NOT NULL DEFAULT 0,
+  INDEX `idx_post_count` (`post_count`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Collections Table (for Bookmarks)
@@ -99,6 +110,8 @@ CREATE TABLE `post_categories` (
   `post_id` INT NOT NULL,
   `category_id` INT NOT NULL,
   PRIMARY KEY (`post_id`, `category_id`),
+  -- "Posts in tag X, newest first": walks one tag's entries by post_id
+  INDEX `idx_category_post` (`category_id`, `post_id`),
   FOREIGN KEY (`post_id`) REFERENCES `posts`(`post_id`) ON DELETE CASCADE,
   FOREIGN KEY (`category_id`) REFERENCES `categories`(`category_id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -115,6 +128,17 @@ CREATE TABLE `post_views` (
   FOREIGN KEY (`post_id`) REFERENCES `posts`(`post_id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- "For you" candidates, rebuilt by backend/app/recommend.py.
+-- The job fills a copy of this table and swaps it in with RENAME TABLE,
+-- so it has no foreign keys; sp_get_for_you_feed joins to live posts.
+CREATE TABLE `user_recommendations` (
+  `user_id` INT NOT NULL,
+  `post_id` INT NOT NULL,
+  `score` FLOAT NOT NULL, -- 0..1, relative to the user's best candidate
+  `generated_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`user_id`, `post_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- =================================================================
 --                          TRIGGERS
 -- =================================================================
@@ -152,6 +176,23 @@ BEGIN
     UPDATE `posts` SET `comments_count` = `comments_count` - 1 WHERE `post_id` = OLD.post_id;
 END; //
 
+-- Triggers for Category Post Count
+-- NOTE: foreign key cascades do not fire triggers, so sp_delete_post
+-- removes a post's post_categories rows itself when it soft-deletes the post.
+CREATE TRIGGER `trg_after_post_category_insert`
+AFTER INSERT ON `post_categories`
+FOR EACH ROW
+BEGIN
+    UPDATE `categories` SET `post_count` = `post_count` + 1 WHERE `category_id` = NEW.category_id;
+END; //
+
+CREATE TRIGGER `trg_after_post_category_delete`
+AFTER DELETE ON `post_categories`
+FOR EACH ROW
+BEGIN
+    UPDATE `categories` SET `post_count` = `post_count` - 1 WHERE `category_id` = OLD.category_id;
+END; //
+
 DELIMITER ;
 
 -- =================================================================
@@ -223,6 +264,7 @@ BEGIN
         u.username, u.email AS user_email, u.created_at AS user_created_at
     FROM `posts` p
     JOIN `users` u ON p.user_id = u.user_id
+    WHERE p.deleted_at IS NULL
     ORDER BY p.created_at DESC
     LIMIT p_limit
     OFFSET p_offset;
@@ -233,8 +275,10 @@ CREATE PROCEDURE `get_post_details`(IN p_post_id INT, IN p_requesting_user_id IN
 BEGIN
     -- Increment the view count for this post
     -- (We'll also log this in the post_views table for analytics)
-    INSERT INTO `post_views` (post_id, user_id) VALUES (p_post_id, p_requesting_user_id);
-    UPDATE `posts` SET `views_count` = `views_count` + 1 WHERE `post_id` = p_post_id;
+    -- (Deleted posts are neither counted nor returned)
+    INSERT INTO `post_views` (post_id, user_id)
+    SELECT `post_id`, p_requesting_user_id FROM `posts` WHERE `post_id` = p_post_id AND `deleted_at` IS NULL;
+    UPDATE `posts` SET `views_count` = `views_count` + 1 WHERE `post_id` = p_post_id AND `deleted_at` IS NULL;
 
     -- Return the detailed post data
     SELECT
@@ -244,7 +288,7 @@ BEGIN
         (SELECT COUNT(1) FROM `post_likes` pl WHERE pl.post_id = p.post_id AND pl.user_id = p_requesting_user_id) > 0 AS is_liked_by_user
     FROM `posts` p
     JOIN `users` u ON p.user_id = u.user_id
-    WHERE p.post_id = p_post_id;
+    WHERE p.post_id = p_post_id AND p.deleted_at IS NULL;
 END; //
 
 -- =================================================================
@@ -286,7 +330,7 @@ BEGIN
     SELECT COUNT(*)
     INTO post_count
     FROM `posts`
-    WHERE `user_id` = p_user_id;
+    WHERE `user_id` = p_user_id AND `deleted_at` IS NULL;
     RETURN post_count;
 END //
 
@@ -304,6 +348,7 @@ BEGIN
     FROM `comments` c
     JOIN `users` u ON c.user_id = u.user_id
     WHERE c.post_id = p_post_id
+      AND EXISTS (SELECT 1 FROM `posts` p WHERE p.post_id = p_post_id AND p.deleted_at IS NULL)
     ORDER BY c.created_at ASC;
 END; //
 
@@ -315,16 +360,19 @@ CREATE PROCEDURE `sp_create_comment`(
     IN p_content TEXT
 )
 BEGIN
+    -- Deleted posts take no new comments (nothing is inserted or returned)
     INSERT INTO `comments` (user_id, post_id, content)
-    VALUES (p_user_id, p_post_id, p_content);
+    SELECT p_user_id, `post_id`, p_content FROM `posts` WHERE `post_id` = p_post_id AND `deleted_at` IS NULL;
     
     -- Return the newly created comment (useful for the frontend)
-    SELECT
-        c.comment_id, c.content, c.created_at, c.parent_id,
-        u.user_id, u.username
-    FROM `comments` c
-    JOIN `users` u ON c.user_id = u.user_id
-    WHERE c.comment_id = LAST_INSERT_ID();
+    IF ROW_COUNT() > 0 THEN
+        SELECT
+            c.comment_id, c.content, c.created_at, c.parent_id,
+            u.user_id, u.username
+        FROM `comments` c
+        JOIN `users` u ON c.user_id = u.user_id
+        WHERE c.comment_id = LAST_INSERT_ID();
+    END IF;
 END; //
 
 
@@ -335,32 +383,35 @@ BEGIN
     DECLARE o_liked BOOLEAN;
     DECLARE o_likes_count INT;
 
-    -- Check if the like already exists
-    SELECT COUNT(1)
-    INTO v_liked_exists
-    FROM `post_likes`
-    WHERE `user_id` = p_user_id AND `post_id` = p_post_id;
-
-    IF v_liked_exists > 0 THEN
-        -- Like exists, so delete it (unlike)
-        DELETE FROM `post_likes`
+    -- Deleted posts cannot be liked or unliked (no result is returned)
+    IF EXISTS (SELECT 1 FROM `posts` WHERE `post_id` = p_post_id AND `deleted_at` IS NULL) THEN
+        -- Check if the like already exists
+        SELECT COUNT(1)
+        INTO v_liked_exists
+        FROM `post_likes`
         WHERE `user_id` = p_user_id AND `post_id` = p_post_id;
-        SET o_liked = FALSE;
-    ELSE
-        -- Like does not exist, so insert it (like)
-        INSERT INTO `post_likes` (user_id, post_id)
-        VALUES (p_user_id, p_post_id);
-        SET o_liked = TRUE;
-    END IF;
-
-    -- Get the new total likes count from the posts table
-    SELECT `likes_count`
-    INTO o_likes_count
-    FROM `posts`
-    WHERE `post_id` = p_post_id;
 
-    -- Return the new state
-    SELECT o_liked AS liked, o_likes_count AS new_count;
+        IF v_liked_exists > 0 THEN
+            -- Like exists, so delete it (unlike)
+            DELETE FROM `post_likes`
+            WHERE `user_id` = p_user_id AND `post_id` = p_post_id;
+            SET o_liked = FALSE;
+        ELSE
+            -- Like does not exist, so insert it (like)
+            INSERT INTO `post_likes` (user_id, post_id)
+            VALUES (p_user_id, p_post_id);
+            SET o_liked = TRUE;
+        END IF;
+
+        -- Get the new total likes count from the posts table
+        SELECT `likes_count`
+        INTO o_likes_count
+        FROM `posts`
+        WHERE `post_id` = p_post_id;
+
+        -- Return the new state
+        SELECT o_liked AS liked, o_likes_count AS new_count;
+    END IF;
 END; //
 
 DELIMITER ;
@@ -392,7 +443,7 @@ BEGIN
         p.post_id, p.title, p.content, p.created_at,
         p.user_id, p.likes_count, p.views_count, p.comments_count
     FROM `posts` p
-    WHERE p.user_id = p_user_id
+    WHERE p.user_id = p_user_id AND p.deleted_at IS NULL
     ORDER BY p.created_at DESC
     LIMIT p_limit
     OFFSET p_offset;
@@ -550,6 +601,7 @@ BEGIN
         -- Get all users that p_user_id is following
         SELECT `followed_id` FROM `follows` WHERE `follower_id` = p_user_id
     )
+    AND p.deleted_at IS NULL
     ORDER BY p.created_at DESC
     LIMIT p_limit
     OFFSET p_offset;
@@ -570,7 +622,8 @@ BEGIN
         u.username
     FROM `posts` p
     JOIN `users` u ON p.user_id = u.user_id
-    WHERE p.title LIKE @search_like OR p.content LIKE @search_like
+    WHERE (p.title LIKE @search_like OR p.content LIKE @search_like)
+      AND p.deleted_at IS NULL
     ORDER BY p.created_at DESC
     LIMIT 10;
 END; //
@@ -598,13 +651,36 @@ BEGIN
     SELECT
         category_id,
         name,
-        (SELECT COUNT(*) FROM post_categories pc WHERE pc.category_id = c.category_id) AS post_count
+        post_count
     FROM `categories` c
     WHERE name LIKE @search_like
     ORDER BY post_count DESC
     LIMIT 10;
 END; //
 
+-- Procedure 4: Posts in one tag, newest first (keyset pagination)
+-- Pass the last post_id of the previous page as p_before_post_id (NULL for the first page).
+CREATE PROCEDURE `sp_get_tag_posts`(
+    IN p_tag_name VARCHAR(100),
+    IN p_before_post_id INT,
+    IN p_limit INT
+)
+BEGIN
+    SELECT
+        p.post_id, p.title, p.content, p.created_at,
+        p.user_id, p.likes_count, p.views_count, p.comments_count,
+        u.username
+    FROM `categories` c
+    JOIN `post_categories` pc ON pc.category_id = c.category_id
+    JOIN `posts` p ON p.post_id = pc.post_id
+    JOIN `users` u ON p.user_id = u.user_id
+    WHERE c.name = p_tag_name
+      AND pc.post_id < IFNULL(p_before_post_id, 2147483647)
+      AND p.deleted_at IS NULL
+    ORDER BY pc.post_id DESC
+    LIMIT p_limit;
+END; //
+
 DELIMITER ; 
 
 DELIMITER //
@@ -692,7 +768,8 @@ BEGIN
         name,
         user_id,
         created_at,
-        (SELECT COUNT(*) FROM bookmarks b WHERE b.collection_id = c.collection_id) AS post_count
+        (SELECT COUNT(*) FROM bookmarks b JOIN posts p ON p.post_id = b.post_id
+         WHERE b.collection_id = c.collection_id AND p.deleted_at IS NULL) AS post_count
     FROM `collections` c
     WHERE user_id = p_user_id
     ORDER BY name ASC;
@@ -722,12 +799,15 @@ CREATE PROCEDURE `sp_add_bookmark`(
 )
 BEGIN
     -- The PRIMARY KEY in your table will prevent duplicates
+    -- (Deleted posts cannot be bookmarked)
     INSERT IGNORE INTO `bookmarks` (user_id, post_id, collection_id)
-    VALUES (p_user_id, p_post_id, p_collection_id);
+    SELECT p_user_id, `post_id`, p_collection_id FROM `posts` WHERE `post_id` = p_post_id AND `deleted_at` IS NULL;
     
-    -- Return the new bookmark
-    SELECT * FROM `bookmarks`
-    WHERE user_id = p_user_id AND post_id = p_post_id AND collection_id = p_collection_id;
+    -- Return the new bookmark (nothing if the post is deleted)
+    SELECT b.* FROM `bookmarks` b
+    JOIN `posts` p ON p.post_id = b.post_id
+    WHERE b.user_id = p_user_id AND b.post_id = p_post_id AND b.collection_id = p_collection_id
+      AND p.deleted_at IS NULL;
 END; //
 
 -- Procedure 4: Remove a bookmark
@@ -749,10 +829,11 @@ CREATE PROCEDURE `sp_check_bookmark_status`(
     IN p_post_id INT
 )
 BEGIN
-    -- Returns a list of collection IDs this post is bookmarked in
-    SELECT collection_id
-    FROM `bookmarks`
-    WHERE user_id = p_user_id AND post_id = p_post_id;
+    -- Returns a list of collection IDs this post is bookmarked in (none once it is deleted)
+    SELECT b.collection_id
+    FROM `bookmarks` b
+    JOIN `posts` p ON p.post_id = b.post_id
+    WHERE b.user_id = p_user_id AND b.post_id = p_post_id AND p.deleted_at IS NULL;
 END; //
 
 -- Procedure 6: Get all posts saved in a specific collection
@@ -769,8 +850,58 @@ BEGIN
     JOIN `users` u ON p.user_id = u.user_id
     JOIN `bookmarks` b ON p.post_id = b.post_id
     WHERE b.user_id = p_user_id AND b.collection_id = p_collection_id
+      AND p.deleted_at IS NULL
     ORDER BY b.created_at DESC;
 END; //
 
 DELIMITER ;
 
+DELIMITER //
+
+-- "For you" feed: the user's precomputed candidates, blended with freshness.
+-- 70% similarity score + 30% freshness (halves every 72 hours); posts
+-- the user liked after the job ran are skipped.
+CREATE PROCEDURE `sp_get_for_you_feed`(IN p_user_id INT, IN p_limit INT, IN p_offset INT)
+BEGIN
+    SELECT
+        p.post_id, p.title, p.content, p.created_at,
+        p.user_id, p.likes_count, p.views_count, p.comments_count,
+        u.username, u.email AS user_email, u.created_at AS user_created_at,
+        r.score AS recommendation_score
+    FROM `user_recommendations` r
+    JOIN `posts` p ON p.post_id = r.post_id
+    JOIN `users` u ON p.user_id = u.user_id
+    WHERE r.user_id = p_user_id
+      AND p.deleted_at IS NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM `post_likes` pl WHERE pl.user_id = p_user_id AND pl.post_id = r.post_id
+      )
+    ORDER BY 0.7 * r.score + 0.3 * POW(0.5, TIMESTAMPDIFF(HOUR, p.created_at, NOW()) / 72) DESC,
+             r.post_id DESC
+    LIMIT p_limit
+    OFFSET p_offset;
+END; //
+
+-- Soft-deletes a post if p_user_id is its author; returns deleted_rows (0 or 1).
+-- Only the post row and its few tag links are touched here. Comments,
+-- likes, views and bookmarks are removed in small batches by the purger
+-- (backend/app/purge.py), which deletes the post row itself last.
+CREATE PROCEDURE `sp_delete_post`(IN p_post_id INT, IN p_user_id INT)
+BEGIN
+    DECLARE v_deleted_rows INT;
+
+    UPDATE `posts` SET `deleted_at` = CURRENT_TIMESTAMP
+    WHERE `post_id` = p_post_id AND `user_id` = p_user_id AND `deleted_at` IS NULL;
+    SET v_deleted_rows = ROW_COUNT();
+
+    IF v_deleted_rows > 0 THEN
+        -- Unlinking the tags now keeps categories.post_count to live posts
+        -- (via trg_after_post_category_delete; cascades would not fire it)
+        DELETE FROM `post_categories` WHERE `post_id` = p_post_id;
+    END IF;
+
+    SELECT v_deleted_rows AS deleted_rows;
+END; //
+
+DELIMITER ;
+
@@ -0,0 +1,147 @@
+# app/admission.py
+"""
+Admission control for the API.
+
+Each request is put in a route class (reads, writes, search, login) with
+its own limit on in-flight requests and a short bounded queue. When the
+queue is full, or a request waits too long for a slot, it is rejected
+straight away with Retry-After instead of piling up on MySQL.
+
+Sync endpoints and dependencies run on anyio's worker threadpool (40
+threads by default). If the limits below added up to more than that,
+admitted requests would wait for a thread where no queue metric or shed
+counter sees them, so size_threadpool() raises the pool at startup to
+cover every admitted request plus UNLIMITED_THREADS for the routes that
+are not limited (admin, static files).
+"""
+import asyncio
+import time
+
+import anyio.to_thread
+
+# Route classes in the order they are shed: search goes first.
+SHED_FIRST = ("search",)
+# Threads kept free for requests classify() does not limit
+UNLIMITED_THREADS = 8
+
+
+class RouteClassLimiter:
+    """Bounded in-flight limiter with a short wait queue for one route class."""
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = None  # Created lazily, inside the running event loop
+        # Metrics
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "queue_timeout": 0, "overload": 0}
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    @property
+    def saturated(self) -> bool:
+        """True once requests of this class are queueing for a slot."""
+        return self.waiting > 0
+
+    async def acquire(self):
+        """
+        Waits for a slot. Returns None when admitted, otherwise the
+        reason the request was shed ('queue_full' or 'queue_timeout').
+        """
+        if self.semaphore.locked() and self.waiting >= self.max_queue:
+            self.shed["queue_full"] += 1
+            return "queue_full"
+
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed["queue_timeout"] += 1
+            return "queue_timeout"
+        finally:
+            self.waiting -= 1
+            waited = time.perf_counter() - start
+            self.queue_time_total += waited
+            self.queue_time_max = max(self.queue_time_max, waited)
+
+        self.in_flight += 1
+        self.admitted += 1
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    def snapshot(self) -> dict:
+        waited = self.admitted + self.shed["queue_timeout"]
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "avg_queue_ms": round(self.queue_time_total / waited * 1000, 3) if waited else 0.0,
+            "max_queue_ms": round(self.queue_time_max * 1000, 3),
+        }
+
+
+LIMITERS = {
+    "read": RouteClassLimiter("read", max_in_flight=32, max_queue=64, queue_timeout=0.5, retry_after=1),
+    "write": RouteClassLimiter("write", max_in_flight=16, max_queue=32, queue_timeout=1.0, retry_after=2),
+    "search": RouteClassLimiter("search", max_in_flight=4, max_queue=4, queue_timeout=0.25, retry_after=5),
+    # bcrypt makes logins CPU-heavy, so keep them on their own small budget
+    "login": RouteClassLimiter("login", max_in_flight=8, max_queue=16, queue_timeout=1.0, retry_after=2),
+}
+
+
+def size_threadpool() -> int:
+    """Makes sure every admitted request can get a worker thread; returns the pool size."""
+    needed = sum(limiter.max_in_flight for limiter in LIMITERS.values()) + UNLIMITED_THREADS
+    thread_limiter = anyio.to_thread.current_default_thread_limiter()
+    if thread_limiter.total_tokens < needed:
+        thread_limiter.total_tokens = needed
+    return thread_limiter.total_tokens
+
+
+def classify(method: str, path: str):
+    """Returns the route class for a request, or None if it is not limited."""
+    if method == "OPTIONS" or path.startswith("/admin"):
+        return None
+    # Static frontend files never touch the database
+    if path == "/" or path.startswith("/assets/") or path.endswith(".html"):
+        return None
+    if path == "/login" or (method == "POST" and path == "/users/"):
+        return "login"
+    if path.startswith("/search"):
+        return "search"
+    if method in ("GET", "HEAD"):
+        return "read"
+    return "write"
+
+
+def should_shed_early(route_class: str) -> bool:
+    """Expensive classes are shed as soon as reads or writes start queueing."""
+    if route_class not in SHED_FIRST:
+        return False
+    return LIMITERS["read"].saturated or LIMITERS["write"].saturated
+
+
+def shed_early(route_class: str):
+    LIMITERS[route_class].shed["overload"] += 1
+
+
+def snapshot() -> dict:
+    return {name: limiter.snapshot() for name, limiter in LIMITERS.items()}
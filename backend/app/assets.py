@@ -0,0 +1,90 @@
+# app/assets.py
+"""
+Serves the built frontend (frontend/dist, see frontend/build_assets.py)
+from the API itself, so pages and API calls share one origin.
+
+Hashed files under /assets never change, so they are cached for a year
+as immutable. Pages are revalidated on every load so new asset hashes
+are picked up. Precompressed .br / .gz copies are sent when the browser
+accepts them.
+"""
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse
+
+DIST_DIR = Path(__file__).resolve().parents[2] / "frontend" / "dist"
+ASSETS_DIR = DIST_DIR / "assets"
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Preferred first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+MEDIA_TYPES = {".js": "application/javascript", ".html": "text/html; charset=utf-8"}
+
+
+def _accepted_encodings(header: str) -> dict:
+    """Parses Accept-Encoding into {coding: q}; a coding with q=0 is refused."""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def _file_response(path: Path, request: Request, cache_control: str) -> FileResponse:
+    """Picks the best precompressed copy of `path` the client accepts."""
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Not found")
+
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    media_type = MEDIA_TYPES.get(path.suffix)
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+
+    def q(encoding):
+        # Codings the header does not list take the "*" q, if there is one
+        return accepted.get(encoding, accepted.get("*", 0.0))
+
+    # Highest q first; ties keep ENCODINGS order
+    for encoding, suffix in sorted(ENCODINGS, key=lambda e: -q(e[0])):
+        compressed = path.with_name(path.name + suffix)
+        if q(encoding) > 0 and compressed.is_file():
+            headers["Content-Encoding"] = encoding
+            return FileResponse(compressed, media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def mount_frontend(app):
+    """Adds the page and asset routes, if the frontend has been built."""
+    if not DIST_DIR.is_dir():
+        print(f"Frontend not built ({DIST_DIR} missing); run frontend/build_assets.py to serve it.")
+        return
+
+    @app.get("/assets/{name}", include_in_schema=False)
+    def get_asset(name: str, request: Request):
+        # Only plain file names: no sub-paths or precompressed files asked for directly
+        if "/" in name or name.endswith((".gz", ".br")):
+            raise HTTPException(status_code=404, detail="Not found")
+        return _file_response(ASSETS_DIR / name, request, IMMUTABLE_CACHE)
+
+    @app.get("/", include_in_schema=False)
+    def get_index(request: Request):
+        return _file_response(DIST_DIR / "index.html", request, REVALIDATE_CACHE)
+
+    @app.get("/{page}.html", include_in_schema=False)
+    def get_page(page: str, request: Request):
+        if "/" in page or page.startswith("."):
+            raise HTTPException(status_code=404, detail="Not found")
+        return _file_response(DIST_DIR / f"{page}.html", request, REVALIDATE_CACHE)
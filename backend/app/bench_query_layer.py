@@ -0,0 +1,81 @@
+# app/bench_query_layer.py
+"""
+Microbenchmark for the query layer: per-call overhead of callproc vs.
+prepared SELECTs, on the C extension vs. the pure-Python driver.
+
+Run from backend/app against a loaded ECHO database:
+    python bench_query_layer.py --iterations 500
+
+Every write is rolled back at the end, so the data is left untouched.
+"""
+import argparse
+import time
+
+import mysql.connector
+
+import query
+from main import DB_USER, DB_PASSWORD, DB_HOST, DB_NAME
+
+
+def connect(use_pure: bool):
+    return mysql.connector.connect(
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        database=DB_NAME,
+        use_pure=use_pure
+    )
+
+
+def time_calls(runner, proc_name, args, iterations):
+    """Returns the mean time per call in microseconds."""
+    runner.call(proc_name, args)  # Warm up (and prepare the statement once)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        runner.call(proc_name, args)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--post-id", type=int, default=1)
+    opts = parser.parse_args()
+
+    # sp_toggle_like has no prepared SELECT, so both modes CALL it; it is
+    # still listed to compare the drivers on a write path.
+    iterations = opts.iterations
+    cases = [
+        ('get_all_posts', [20, 0]),
+        ('sp_toggle_like', [opts.user_id, opts.post_id]),
+        ('sp_get_user_profile', [opts.user_id]),
+    ]
+
+    drivers = [("pure", True)]
+    if mysql.connector.HAVE_CEXT:
+        drivers.insert(0, ("c-ext", False))
+    else:
+        print("C extension not available; only benchmarking the pure driver.")
+
+    print(f"{'procedure':<22}{'driver':<8}{'callproc (us)':>15}{'prepared (us)':>15}{'speedup':>10}")
+    for label, use_pure in drivers:
+        conn = connect(use_pure)
+        assert query.driver_name(conn) == label, f"asked for {label}, got {query.driver_name(conn)}"
+        try:
+            # The result cache is bypassed so every call really hits the database
+            callproc_runner = query.QueryRunner(lambda: conn, use_prepared=False, result_cache=None)
+            prepared_runner = query.QueryRunner(lambda: conn, use_prepared=True, result_cache=None)
+            for proc_name, args in cases:
+                plain = time_calls(callproc_runner, proc_name, args, iterations)
+                prepared = time_calls(prepared_runner, proc_name, args, iterations)
+                print(f"{proc_name:<22}{label:<8}{plain:>15.1f}{prepared:>15.1f}{plain / prepared:>9.2f}x")
+            callproc_runner.close()
+            prepared_runner.close()
+        finally:
+            conn.rollback()
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
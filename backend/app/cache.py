@@ -0,0 +1,210 @@
+# app/cache.py
+"""
+In-process cache for procedure results.
+
+Entries are keyed by (procedure name, arguments), evicted LRU-first once
+the memory cap is reached, and expire after a per-procedure TTL. Each
+entry carries tags (e.g. 'post:12', 'user_posts:3'); write procedures
+invalidate by tag, so only the entries they affect are dropped.
+
+A reader that misses queries MySQL without holding the lock, so a write
+can commit and invalidate while it runs. Every invalidation bumps a
+sequence number and stamps its tags with it; the reader takes the
+sequence before querying (begin_fill) and set() drops its rows if any of
+their tags was invalidated since, instead of caching pre-write data for
+a full TTL.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+MAX_CACHE_BYTES = 32 * 1024 * 1024
+
+
+def _tag_key(name: str) -> str:
+    # Category names compare case-insensitively in MySQL
+    return name.strip().lower()
+
+
+def _new_post_tags(args):
+    """Tag feeds touched by sp_create_post(user_id, title, content, categories_csv)."""
+    csv = args[3] if len(args) > 3 and args[3] else ""
+    return {f"tag_posts:{_tag_key(name)}" for name in csv.split(",") if name.strip()}
+
+
+def _post_tags(rows):
+    return {f"post:{row['post_id']}" for row in rows if 'post_id' in row}
+
+
+# proc name -> (ttl seconds, fn(args, rows) -> tags)
+CACHE_POLICIES = {
+    'get_all_posts': (10, lambda args, rows: {"posts:list"} | _post_tags(rows)),
+    'sp_get_user_posts': (30, lambda args, rows: {f"user_posts:{args[0]}"} | _post_tags(rows)),
+    'sp_get_user_profile': (30, lambda args, rows: {f"user:{args[0]}"}),
+    'sp_search_tags': (60, lambda args, rows: {"tags"}),
+    # Only changes when recommend.py runs; post tags drop deleted posts
+    'sp_get_for_you_feed': (60, lambda args, rows: {f"for_you:{args[0]}"} | _post_tags(rows)),
+    'sp_get_tag_posts': (30, lambda args, rows: {f"tag_posts:{_tag_key(args[0])}"} | _post_tags(rows)),
+}
+
+# proc name -> fn(args) -> tags to invalidate once the write commits
+INVALIDATIONS = {
+    'sp_create_post': lambda args: {"posts:list", f"user_posts:{args[0]}", f"user:{args[0]}", "tags"} | _new_post_tags(args),
+    'sp_delete_post': lambda args: {f"post:{args[0]}", "posts:list", f"user_posts:{args[1]}", f"user:{args[1]}", "tags"},
+    'sp_toggle_like': lambda args: {f"post:{args[1]}"},
+    'sp_create_comment': lambda args: {f"post:{args[1]}"},
+    'sp_toggle_follow': lambda args: {f"user:{args[0]}", f"user:{args[1]}"},
+}
+
+
+def _estimate_size(rows) -> int:
+    """Rough size in bytes of a list of dict rows."""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row.values():
+            size += sys.getsizeof(value)
+    return size
+
+
+class _Entry:
+    __slots__ = ("rows", "expires_at", "tags", "size")
+
+    def __init__(self, rows, expires_at, tags, size):
+        self.rows = rows
+        self.expires_at = expires_at
+        self.tags = tags
+        self.size = size
+
+
+class ResultCache:
+    """Thread-safe LRU cache of procedure results with TTLs and tag invalidation."""
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+        self._sequence = 0  # Bumped by every invalidate()
+        self._invalidated_at = {}  # tag -> sequence of its last invalidation, while a fill may need it
+        self._fills = {}  # sequence taken by an in-flight fill -> number of fills
+
+    @staticmethod
+    def make_key(proc_name: str, args):
+        return (proc_name, tuple(args))
+
+    def get(self, key):
+        """Returns the cached rows, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.rows
+
+    def begin_fill(self) -> int:
+        """Call before querying for a miss; pass the result to set() and end_fill()."""
+        with self._lock:
+            self._fills[self._sequence] = self._fills.get(self._sequence, 0) + 1
+            return self._sequence
+
+    def end_fill(self, token: int):
+        with self._lock:
+            remaining = self._fills.pop(token) - 1
+            if remaining:
+                self._fills[token] = remaining
+            self._prune_invalidated()
+
+    def set(self, key, rows, ttl: float, tags, token=None):
+        """
+        Stores rows. With the `token` from begin_fill(), the rows are dropped
+        if any of their tags was invalidated after the query started.
+        """
+        size = _estimate_size(rows)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if token is not None and any(self._invalidated_at.get(tag, -1) > token for tag in tags):
+                self.stale_fills += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(rows, time.monotonic() + ttl, frozenset(tags), size)
+            self.bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        """Drops every entry carrying any of the given tags."""
+        with self._lock:
+            self._sequence += 1
+            if self._fills:
+                for tag in tags:
+                    self._invalidated_at[tag] = self._sequence
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.bytes = 0
+
+    def _prune_invalidated(self):
+        """Forgets invalidations no in-flight fill started before; the caller must hold the lock."""
+        if not self._fills:
+            self._invalidated_at.clear()
+        elif self._invalidated_at:
+            oldest = min(self._fills)
+            self._invalidated_at = {tag: seq for tag, seq in self._invalidated_at.items() if seq > oldest}
+
+    def _remove(self, key):
+        """Removes one entry; the caller must hold the lock."""
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_fills": self.stale_fills,
+            }
+
+
+RESULT_CACHE = ResultCache()
@@ -174,4 +174,60 @@ def create_bookmark(cursor, bookmark: schemas.BookmarkCreate, user_id: int):
         (user_id, bookmark.post_id, bookmark.collection_id)
     )
     # Commit is handled by the dependency
-    return {"status": "ok", "user_id": user_id, "post_id": bookmark.post_id, "collection_id": bookmark.collection_id}
\ No newline at end of file
+    return {"status": "ok", "user_id": user_id, "post_id": bookmark.post_id, "collection_id": bookmark.collection_id}
+
+# --- Viewer State Functions ---
+MAX_VIEWER_STATE_POSTS = 100
+
+def get_viewer_state(cursor, user_id: int, post_ids: list):
+    """
+    Returns the viewer's like, bookmark and follow state for a page of posts.
+    Always runs exactly three set-based queries, no matter how many posts are asked for.
+    """
+    # De-duplicate but keep the caller's order for the response
+    post_ids = list(dict.fromkeys(post_ids))
+    if not post_ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(post_ids))
+
+    # 1. Posts (and their authors) joined with the viewer's follow row, if any
+    cursor.execute(
+        f"""
+        SELECT p.post_id, p.user_id AS author_id, f.follower_id IS NOT NULL AS is_following_author
+        FROM posts p
+        LEFT JOIN follows f ON f.followed_id = p.user_id AND f.follower_id = %s
+        WHERE p.post_id IN ({placeholders}) AND p.deleted_at IS NULL;
+        """,
+        (user_id, *post_ids)
+    )
+    posts = {row['post_id']: row for row in cursor.fetchall()}
+
+    # 2. Which of these posts the viewer has liked (uses the (user_id, post_id) PK)
+    cursor.execute(
+        f"SELECT post_id FROM post_likes WHERE user_id = %s AND post_id IN ({placeholders});",
+        (user_id, *post_ids)
+    )
+    liked = {row['post_id'] for row in cursor.fetchall()}
+
+    # 3. Which collections each post is bookmarked in (uses the (user_id, post_id, collection_id) PK)
+    cursor.execute(
+        f"SELECT post_id, collection_id FROM bookmarks WHERE user_id = %s AND post_id IN ({placeholders});",
+        (user_id, *post_ids)
+    )
+    bookmarked = {}
+    for row in cursor.fetchall():
+        bookmarked.setdefault(row['post_id'], []).append(row['collection_id'])
+
+    states = []
+    for post_id in post_ids:
+        post = posts.get(post_id)
+        if post is None:
+            continue  # Unknown and deleted post ids are simply left out
+        states.append({
+            "post_id": post_id,
+            "author_id": post['author_id'],
+            "is_liked": post_id in liked,
+            "bookmarked_collection_ids": bookmarked.get(post_id, []),
+            "is_following_author": bool(post['is_following_author']),
+        })
+    return states
@@ -2,10 +2,18 @@
 import mysql.connector 
 from mysql.connector import errorcode
 from fastapi import FastAPI, Depends, HTTPException, status
-from typing import List
+from typing import List, Optional
+import admission
+import assets
+import cache
 import crud
+import purge
+import query
 import schemas  # Make sure schemas.py has CommentCreate and LikeRequest
+import timing
+import typeahead
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel # Keep this import for the Pydantic models in schemas.py
 
 # --- Database Connection Config ---
@@ -13,16 +21,30 @@ DB_USER = "root"
 DB_PASSWORD ="anurag10"
 DB_HOST = "localhost"
 DB_NAME ="ECHO"
+# Largest page the tag feed will return
+MAX_TAG_PAGE_SIZE = 50
+# True forces the pure-Python protocol. False leaves the choice to the connector,
+# which uses the C extension when it is installed and falls back otherwise
+# (an explicit use_pure=False would raise ImportError without the extension).
+DB_USE_PURE = False
+# Prepared statements are cached per connection, and connections are opened
+# per request, so preparing would add round trips instead of saving them.
+# Turn this on once connections are reused across requests.
+DB_USE_PREPARED = False
 
 def get_db_connection():
     """Establishes a new database connection."""
     try:
-        conn = mysql.connector.connect(
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            database=DB_NAME
-        )
+        # use_pure is only passed when forcing the pure driver (see DB_USE_PURE)
+        driver = {"use_pure": True} if DB_USE_PURE else {}
+        with timing.phase("db-connect"):
+            conn = mysql.connector.connect(
+                user=DB_USER,
+                password=DB_PASSWORD,
+                host=DB_HOST,
+                database=DB_NAME,
+                **driver
+            )
         return conn
     except mysql.connector.Error as err:
         if err.errno == errorcode.ER_BAD_DB_ERROR:
@@ -37,6 +59,8 @@ app = FastAPI(
     description="API for the Echo blogging platform, now with MySQL.",
     version="1.1.0"
 )
+# Every route records validate/endpoint/serialize time for Server-Timing
+app.router.route_class = timing.TimedRoute
 
 origins = [
     "null",
@@ -48,13 +72,98 @@ origins = [
     "http://127.0.0.1:5501",
 ]
 
+# --- Admission Control ---
+# Registered before CORS so that CORS stays the outermost middleware and
+# shed responses still carry CORS headers the browser can read.
+@app.middleware("http")
+async def admission_control(request, call_next):
+    """
+    Limits in-flight requests per route class and sheds load with a fast
+    503/429 + Retry-After instead of letting requests queue on MySQL.
+    """
+    route_class = admission.classify(request.method, request.url.path)
+    if route_class is None:
+        return await call_next(request)
+
+    limiter = admission.LIMITERS[route_class]
+    if admission.should_shed_early(route_class):
+        admission.shed_early(route_class)
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is busy, please retry shortly"},
+            headers={"Retry-After": str(limiter.retry_after)},
+        )
+
+    with timing.phase("queue"):
+        rejection = await limiter.acquire()
+    if rejection is not None:
+        # A full queue means too many of these requests; a timeout means the DB is saturated
+        return JSONResponse(
+            status_code=429 if rejection == "queue_full" else 503,
+            content={"detail": "Server is busy, please retry shortly"},
+            headers={"Retry-After": str(limiter.retry_after)},
+        )
+    try:
+        return await call_next(request)
+    finally:
+        limiter.release()
+
+# --- Request Timing ---
+# Registered after admission control so it wraps it: queue time and shed
+# responses show up in Server-Timing too.
+@app.middleware("http")
+async def request_timing(request, call_next):
+    """
+    Adds a Server-Timing header with per-phase durations and samples slow
+    requests into the ring buffer behind /admin/slow-requests.
+    """
+    trace, token = timing.start_request(request.method, request.url.path)
+    try:
+        response = await call_next(request)
+        response.headers["Server-Timing"] = timing.finish_request(trace, response.status_code)
+        return response
+    finally:
+        timing.end_request(token)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],  # This should allow all methods including OPTIONS
     allow_headers=["*"], 
+    expose_headers=["Server-Timing"],  # So the frontend (and DevTools) can read the phase timings
 )
+# --- Background Jobs ---
+@app.on_event("startup")
+async def size_threadpool():
+    """Grows the worker threadpool to fit the admission limits (runs inside the event loop)."""
+    admission.size_threadpool()
+
+@app.on_event("startup")
+def start_purger():
+    """Starts the thread that purges soft-deleted posts in small batches."""
+    purge.start(get_db_connection)
+
+@app.on_event("startup")
+def load_typeahead():
+    """Builds the in-memory username / tag prefix indexes."""
+    conn = get_db_connection()
+    if conn is None:
+        print("Typeahead not loaded: could not connect to the database.")
+        return
+    try:
+        typeahead.load(conn)
+    except Exception as e:
+        print(f"Error loading typeahead: {e}")
+    finally:
+        if conn.is_connected():
+            conn.close()
+
+@app.on_event("shutdown")
+def stop_purger():
+    if purge.PURGER is not None:
+        purge.PURGER.stop()
+
 # --- NEW: Corrected Database Dependency ---
 def get_db():
     """
@@ -64,13 +173,17 @@ def get_db():
     if conn is None:
         raise HTTPException(status_code=503, detail="Could not connect to the database.")
     
-    # Use dictionary=True so all fetches return dicts
-    cursor = conn.cursor(dictionary=True)
+    # Use dictionary=True so all fetches return dicts; the proxy times each call
+    cursor = timing.TracedCursor(conn.cursor(dictionary=True))
+    # Same as QueryRunner.after_commit: callbacks that must only see committed data
+    cursor.after_commit = []
     try:
         yield cursor
         # If no exceptions, commit any changes made
         # This is CRUCIAL for likes, comments, and views
-        conn.commit()
+        with timing.phase("commit"):
+            conn.commit()
+        query.run_after_commit(cursor.after_commit)
     except Exception as e:
         # If any exception occurs, roll back
         conn.rollback()
@@ -84,6 +197,33 @@ def get_db():
         if conn and conn.is_connected():
             conn.close()
 
+def get_runner():
+    """
+    Dependency that provides a QueryRunner (result cache, and prepared
+    statements when DB_USE_PREPARED is on) and handles commit/close, like get_db.
+    The connection is only opened on the first cache miss or write, so
+    requests served from the result cache skip the connect entirely.
+    """
+    def connect():
+        conn = get_db_connection()
+        if conn is None:
+            raise HTTPException(status_code=503, detail="Could not connect to the database.")
+        return conn
+
+    runner = query.QueryRunner(connect, use_prepared=DB_USE_PREPARED)
+    try:
+        yield runner
+        # Commits and then applies any result-cache invalidations
+        runner.commit()
+    except Exception as e:
+        runner.rollback()
+        print(f"Error in get_runner: {e}")
+        raise e
+    finally:
+        runner.close()
+        if runner.conn is not None and runner.conn.is_connected():
+            runner.conn.close()
+
 # --- User Endpoints ---
 # (MODIFIED: Now uses `cursor=Depends(get_db)` and passes cursor to crud)
 @app.post("/users/", response_model=schemas.User, status_code=status.HTTP_201_CREATED, tags=["Users"])
@@ -97,6 +237,11 @@ def create_new_user(user: schemas.UserCreate, cursor=Depends(get_db)):
         
         if not new_user:
             raise HTTPException(status_code=500, detail="Failed to create user")
+
+        # Indexed only once the signup has committed
+        cursor.after_commit.append(lambda: typeahead.USERS.upsert(new_user['user_id'], {
+            "user_id": new_user['user_id'], "username": new_user['username'], "follower_count": 0,
+        }))
         
         return new_user
         
@@ -159,7 +304,7 @@ def create_new_bookmark(bookmark: schemas.BookmarkCreate, cursor=Depends(get_db)
             new_bookmark = result.fetchone()
         
         if not new_bookmark:
-            # This can happen if the post or collection doesn't exist (foreign key constraint)
+            # This can happen if the post is deleted, or the post or collection doesn't exist
             raise HTTPException(status_code=404, detail="Post or Collection not found")
         
         return new_bookmark
@@ -237,27 +382,38 @@ def get_posts_in_collection(
 # === THIS IS THE ONLY /posts/ ENDPOINT NOW ===
 
 @app.post("/posts/", tags=["Posts"], status_code=status.HTTP_201_CREATED)
-def create_new_post(post: schemas.PostCreate, cursor = Depends(get_db)):
+def create_new_post(post: schemas.PostCreate, runner = Depends(get_runner)):
     """
     Creates a new post and links any provided categories.
     Corresponds to `sp_create_post` procedure.
     """
     try:
         # Pass the new categories string to the procedure
-        cursor.callproc('sp_create_post', [
+        new_post = runner.call('sp_create_post', [
             post.user_id, 
             post.title, 
             post.content, 
             post.categories # This can be None or a string
         ])
-        for result in cursor.stored_results():
-            new_post = result.fetchall()
         
         if not new_post:
             raise HTTPException(status_code=500, detail="Failed to create post")
+
+        # New tags (and new post counts) go into the typeahead index once the post commits
+        tags = [
+            tag
+            for name in typeahead.tag_names(post.categories)
+            for tag in runner.fetch_all(typeahead.TAG_BY_NAME_SQL, [name])
+        ]
+        def index_tags():
+            for tag in tags:
+                typeahead.TAGS.upsert(tag['category_id'], tag)
+        runner.after_commit.append(index_tags)
             
         # The procedure returns a list, so return the first item
         return new_post[0]
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error: {e}")
         # Handle duplicate titles or other DB errors
@@ -265,14 +421,29 @@ def create_new_post(post: schemas.PostCreate, cursor = Depends(get_db)):
     
     
 @app.get("/posts/", tags=["Posts"])
-def get_posts(limit: int = 20, offset: int = 0, cursor = Depends(get_db)):
+def get_posts(limit: int = 20, offset: int = 0, runner = Depends(get_runner)):
     """
-    Fetches all posts. Corresponds to `get_all_posts` procedure.
+    Fetches all posts. Corresponds to `get_all_posts` procedure
+    (run as a prepared SELECT by the query layer).
     """
-    cursor.callproc('get_all_posts', [limit, offset])
-    for result in cursor.stored_results():
-        posts = result.fetchall()
-    return posts
+    return runner.call('get_all_posts', [limit, offset])
+
+@app.post("/posts/viewer-state", response_model=List[schemas.PostViewerState], tags=["Posts"])
+def get_posts_viewer_state(state_request: schemas.ViewerStateRequest, cursor=Depends(get_db)):
+    """
+    Returns like, bookmark and follow state for a whole page of posts at once,
+    so the frontend doesn't need per-post calls to render a feed.
+    """
+    if len(state_request.post_ids) > crud.MAX_VIEWER_STATE_POSTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {crud.MAX_VIEWER_STATE_POSTS} post_ids per request"
+        )
+    try:
+        return crud.get_viewer_state(cursor, state_request.user_id, state_request.post_ids)
+    except Exception as e:
+        print(f"Error in get_posts_viewer_state: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/posts/{post_id}", tags=["Posts"])
 def get_post_details(post_id: int, user_id: int, cursor = Depends(get_db)):
@@ -304,44 +475,46 @@ def get_post_comments(post_id: int, cursor = Depends(get_db)):
     return comments
 
 @app.post("/posts/{post_id}/like", tags=["Posts"])
-def toggle_post_like(post_id: int, like_request: schemas.LikeRequest, cursor = Depends(get_db)):
+def toggle_post_like(post_id: int, like_request: schemas.LikeRequest, runner = Depends(get_runner)):
     """
     Toggles a like on a post.
     Corresponds to `sp_toggle_like` procedure.
     """
-    cursor.callproc('sp_toggle_like', [like_request.user_id, post_id])
-    for result in cursor.stored_results():
-        like_status = result.fetchall()
-    return like_status
+    new_state = runner.call('sp_toggle_like', [like_request.user_id, post_id])
+    if not new_state:
+        # The procedure returns nothing for deleted posts
+        raise HTTPException(status_code=404, detail="Post not found")
+    return new_state
 
 @app.post("/posts/{post_id}/comments", tags=["Posts"])
-def create_comment(post_id: int, comment: schemas.CommentCreate, cursor = Depends(get_db)):
+def create_comment(post_id: int, comment: schemas.CommentCreate, runner = Depends(get_runner)):
     """
     Creates a new comment on a post.
     Corresponds to `sp_create_comment` procedure.
     """
-    cursor.callproc('sp_create_comment', [comment.user_id, post_id, comment.content])
-    for result in cursor.stored_results():
-        new_comment = result.fetchall()
+    new_comment = runner.call('sp_create_comment', [comment.user_id, post_id, comment.content])
+    if not new_comment:
+        # The procedure returns nothing for deleted posts
+        raise HTTPException(status_code=404, detail="Post not found")
     
-    # Commit is handled by the get_db dependency
+    # Commit is handled by the get_runner dependency
     return new_comment
 
 @app.get("/users/{user_id}", response_model=schemas.UserProfile, tags=["Users"])
-def get_user_profile(user_id: int, cursor=Depends(get_db)):
+def get_user_profile(user_id: int, runner=Depends(get_runner)):
     """
     Fetches detailed profile information for a single user,
     including their post, follower, and following counts.
     """
     try:
-        cursor.callproc('sp_get_user_profile', [user_id])
-        for result in cursor.stored_results():
-            profile = result.fetchone() # Use fetchone() since we expect 1 user
+        profile = runner.call_one('sp_get_user_profile', [user_id])
         
         if not profile:
             raise HTTPException(status_code=404, detail="User not found")
         
         return profile
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -349,16 +522,14 @@ def get_user_profile(user_id: int, cursor=Depends(get_db)):
 
 # --- ADD THIS ENDPOINT (e.g., after the one above) ---
 @app.get("/users/{user_id}/posts", tags=["Users"])
-def get_posts_by_user(user_id: int, limit: int = 20, offset: int = 0, cursor=Depends(get_db)):
+def get_posts_by_user(user_id: int, limit: int = 20, offset: int = 0, runner=Depends(get_runner)):
     """
     Fetches all posts created by a specific user.
     """
     try:
-        cursor.callproc('sp_get_user_posts', [user_id, limit, offset])
-        for result in cursor.stored_results():
-            posts = result.fetchall()
-        
-        return posts
+        return runner.call('sp_get_user_posts', [user_id, limit, offset])
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -381,7 +552,7 @@ def check_follow_status(user_id: int, follower_id: int, cursor=Depends(get_db)):
 
 
 @app.post("/users/{user_id}/follow", tags=["Users"])
-def toggle_follow_user(user_id: int, follow_request: schemas.FollowRequest, cursor=Depends(get_db)):
+def toggle_follow_user(user_id: int, follow_request: schemas.FollowRequest, runner=Depends(get_runner)):
     """
     Toggles the follow state between the requesting user and the user_id.
     'user_id' is the person being followed.
@@ -394,9 +565,11 @@ def toggle_follow_user(user_id: int, follow_request: schemas.FollowRequest, curs
         if follower_id == followed_id:
             raise HTTPException(status_code=400, detail="Cannot follow yourself")
 
-        cursor.callproc('sp_toggle_follow', [follower_id, followed_id])
-        for result in cursor.stored_results():
-            new_state = result.fetchone() # e.g., {'is_following': 1, 'new_follower_count': 1}
+        new_state = runner.call_one('sp_toggle_follow', [follower_id, followed_id]) # e.g., {'is_following': 1, 'new_follower_count': 1}
+        if new_state:
+            runner.after_commit.append(
+                lambda: typeahead.USERS.set_score(followed_id, new_state['new_follower_count'])
+            )
         
         return new_state
     except HTTPException:
@@ -428,7 +601,7 @@ def check_follow_status(user_id: int, follower_id: int, cursor=Depends(get_db)):
 
 
 @app.post("/users/{user_id}/follow", tags=["Users"])
-def toggle_follow_user(user_id: int, follow_request: schemas.FollowRequest, cursor=Depends(get_db)):
+def toggle_follow_user(user_id: int, follow_request: schemas.FollowRequest, runner=Depends(get_runner)):
     """
     Toggles the follow state between the requesting user and the user_id.
     'user_id' is the person being followed.
@@ -441,9 +614,11 @@ def toggle_follow_user(user_id: int, follow_request: schemas.FollowRequest, curs
         if follower_id == followed_id:
             raise HTTPException(status_code=400, detail="Cannot follow yourself")
 
-        cursor.callproc('sp_toggle_follow', [follower_id, followed_id])
-        for result in cursor.stored_results():
-            new_state = result.fetchone() # e.g., {'is_following': 1, 'new_follower_count': 1}
+        new_state = runner.call_one('sp_toggle_follow', [follower_id, followed_id]) # e.g., {'is_following': 1, 'new_follower_count': 1}
+        if new_state:
+            runner.after_commit.append(
+                lambda: typeahead.USERS.set_score(followed_id, new_state['new_follower_count'])
+            )
         
         return new_state
     except HTTPException:
@@ -470,8 +645,28 @@ def get_home_feed(user_id: int, limit: int = 20, offset: int = 0, cursor=Depends
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
+@app.get("/feed/for-you", tags=["Posts"])
+def get_for_you_feed(user_id: int, limit: int = 20, offset: int = 0, runner=Depends(get_runner)):
+    """
+    Gets the personalized feed precomputed by recommend.py, blended with
+    freshness. Users with no recommendations yet get the latest posts.
+    """
+    try:
+        posts = runner.call('sp_get_for_you_feed', [user_id, limit, offset])
+        if not posts:
+            # An empty later page just means the candidates ran out
+            has_recommendations = offset > 0 and runner.call('sp_get_for_you_feed', [user_id, 1, 0])
+            if not has_recommendations:
+                posts = runner.call('get_all_posts', [limit, offset])
+        return posts
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in get_for_you_feed: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
 @app.get("/search", response_model=schemas.SearchResults, tags=["Search"])
-def search_all(q: str, cursor=Depends(get_db)):
+def search_all(q: str, runner=Depends(get_runner)):
     """
     Performs a site-wide search for posts, users, and tags.
     """
@@ -480,51 +675,74 @@ def search_all(q: str, cursor=Depends(get_db)):
 
     try:
         # 1. Search Posts
-        cursor.callproc('sp_search_posts', [q])
-        posts = []
-        for result in cursor.stored_results():
-            posts = result.fetchall()
+        posts = runner.call('sp_search_posts', [q])
         
         # 2. Search Users
-        cursor.callproc('sp_search_users', [q])
-        users = []
-        for result in cursor.stored_results():
-            users = result.fetchall()
+        users = runner.call('sp_search_users', [q])
             
-        # 3. Search Tags
-        cursor.callproc('sp_search_tags', [q])
-        tags = []
-        for result in cursor.stored_results():
-            tags = result.fetchall()
+        # 3. Search Tags (cached: common prefixes repeat across users)
+        tags = runner.call('sp_search_tags', [q])
             
         return {"posts": posts, "users": users, "tags": tags}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in search_all: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/typeahead", response_model=schemas.TypeaheadResults, tags=["Search"])
+def get_typeahead(q: str = "", limit: int = 5):
+    """
+    Prefix suggestions for the search box: users ranked by followers and
+    tags ranked by posts. Served from memory, no database round trip.
+    """
+    typeahead.reload_if_stale(get_db_connection)
+    return typeahead.suggest(q, max(1, limit))
+
+
+@app.get("/tags/{tag_name}/posts", response_model=List[schemas.PostSearchResult], tags=["Search"])
+def get_tag_posts(tag_name: str, before: Optional[int] = None, limit: int = 20, runner=Depends(get_runner)):
+    """
+    Gets the posts in a tag, newest first.
+    Pages by post_id: pass the last post_id you got as `before` for the next page.
+    """
+    limit = max(1, min(limit, MAX_TAG_PAGE_SIZE))
+    try:
+        return runner.call('sp_get_tag_posts', [tag_name, before, limit])
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in get_tag_posts: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
     
 
 class DeleteRequest(BaseModel):
     user_id: int   
 
 @app.delete("/posts/{post_id}", status_code=status.HTTP_200_OK, tags=["Posts"])
-def delete_post(post_id: int, delete_request: DeleteRequest, cursor=Depends(get_db)):
+def delete_post(post_id: int, delete_request: DeleteRequest, runner=Depends(get_runner)):
     """
     Deletes a post, but only if the user_id matches the post's author.
+    The post is soft-deleted (hidden at once) and purged in the background.
     """
     try:
-        cursor.callproc('sp_delete_post', [post_id, delete_request.user_id])
-        for result in cursor.stored_results():
-            status = result.fetchone()
+        result = runner.call_one('sp_delete_post', [post_id, delete_request.user_id])
         
-        if status['deleted_rows'] == 0:
+        if not result or result['deleted_rows'] == 0:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Post not found or user not authorized to delete"
             )
-            
+
+        # The post is hidden now; its comments, likes etc. are purged in the background
+        if purge.PURGER is not None:
+            purge.PURGER.wake()
         return {"status": "Post deleted successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in delete_post: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -572,4 +790,52 @@ def mark_notifications_read(user_id: int, cursor=Depends(get_db)):
         return status
     except Exception as e:
         print(f"Error: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+# --- Admin Endpoints ---
+@app.get("/admin/admission", tags=["Admin"])
+def get_admission_metrics():
+    """
+    In-flight, queue and shed counts plus queue times for each route class.
+    """
+    return admission.snapshot()
+
+
+@app.get("/admin/cache", tags=["Admin"])
+def get_cache_stats():
+    """
+    Hit/miss, eviction and invalidation counts for the procedure result cache.
+    """
+    return cache.RESULT_CACHE.stats()
+
+
+@app.get("/admin/slow-requests", tags=["Admin"])
+def get_slow_requests(limit: int = 50):
+    """
+    Sampled requests slower than the threshold, newest first, with phase
+    timings and the procedures they called (arguments and row counts).
+    """
+    return timing.slow_requests(limit)
+
+
+@app.get("/admin/typeahead", tags=["Admin"])
+def get_typeahead_stats():
+    """
+    Size and age of the in-memory typeahead indexes.
+    """
+    return typeahead.stats()
+
+
+@app.get("/admin/purge-status", tags=["Admin"])
+def get_purge_status():
+    """
+    Progress of the background purge of soft-deleted posts.
+    """
+    if purge.PURGER is None:
+        return {"state": "not started"}
+    return purge.PURGER.status()
+
+
+# --- Frontend (built by frontend/build_assets.py) ---
+assets.mount_frontend(app)
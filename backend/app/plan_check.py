@@ -0,0 +1,626 @@
+# app/plan_check.py
+"""
+Query-plan regression suite for the stored procedures in EchoDB.sql.
+
+1. Loads EchoDB.sql into a scratch database (ECHO_PLANCHECK by default)
+   and fills it with a generated dataset of realistic size.
+2. Runs EXPLAIN FORMAT=JSON on the statements behind each procedure and
+   checks them: expected indexes are used, and no full scan or filesort
+   touches more rows than the thresholds allow.
+3. CALLs each procedure once and records the rows it really examined
+   (Handler_read_* counters), then rolls back whatever it wrote.
+
+EXPLAIN cannot look inside a CALL, so step 2 runs a copy of each
+procedure's statement. Every case pins a hash of the procedure bodies it
+copies (from information_schema.ROUTINES); a procedure edited without
+updating its case fails the run, with the new hash in the message.
+
+Exits with status 1 if any check fails, so it can gate schema or
+procedure changes. Run from backend/app:
+    python plan_check.py                 # build data, check, report
+    python plan_check.py --reuse         # skip the data load
+    python plan_check.py --report plans.json
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import mysql.connector
+
+import purge
+from main import DB_USER, DB_PASSWORD, DB_HOST
+
+SCHEMA_FILE = Path(__file__).resolve().parents[2] / "EchoDB.sql"
+PLANCHECK_DB = "ECHO_PLANCHECK"
+
+# Default thresholds, in rows. A case can raise them (with a reason) in `known`.
+FULL_SCAN_ROW_LIMIT = 1000
+FILESORT_ROW_LIMIT = 1000
+ROWS_EXAMINED_LIMIT = 5000
+# Headroom on `known` limits derived from the dataset; EXPLAIN's index-dive
+# estimates land within a few percent of the counted rows
+KNOWN_MARGIN = 1.05
+
+# Rows generated at --scale 1
+DATASET = {
+    "users": 2000,
+    "categories": 200,
+    "posts": 20000,
+    "follows_per_user": 10,
+    "likes": 100000,
+    "comments": 60000,
+    "views": 100000,
+    "bookmarks": 10000,
+}
+
+
+# =================================================================
+#                          SCHEMA + DATA
+# =================================================================
+
+def split_sql(text: str):
+    """Splits a mysql-client script into statements, honouring DELIMITER."""
+    delimiter = ";"
+    statements, buffer = [], []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith("DELIMITER"):
+            delimiter = stripped.split()[1]
+            continue
+        buffer.append(line)
+        if stripped.endswith(delimiter):
+            statement = "\n".join(buffer).strip()
+            statement = statement[: -len(delimiter)].strip()
+            if delimiter != ";":
+                statement = statement.rstrip(";").strip()
+            if statement and not all(l.strip().startswith("--") for l in statement.splitlines()):
+                statements.append(statement)
+            buffer = []
+    return statements
+
+
+def load_schema(cursor, db_name: str):
+    """Recreates `db_name` from EchoDB.sql (tables, triggers, procedures, seed rows)."""
+    cursor.execute(f"DROP DATABASE IF EXISTS `{db_name}`")
+    cursor.execute(f"CREATE DATABASE `{db_name}` DEFAULT CHARSET utf8mb4")
+    cursor.execute(f"USE `{db_name}`")
+    for statement in split_sql(SCHEMA_FILE.read_text(encoding="utf-8")):
+        if re.match(r"(CREATE DATABASE|USE)\b", statement, re.IGNORECASE):
+            continue
+        try:
+            cursor.execute(statement)
+        except mysql.connector.Error as err:
+            if err.errno == 1304:  # Procedure defined twice in the script; the first one wins
+                continue
+            raise
+
+
+def insert_rows(cursor, sql: str, rows, batch: int = 2000):
+    for start in range(0, len(rows), batch):
+        cursor.executemany(sql, rows[start:start + batch])
+
+
+def seed_dataset(conn, scale: float = 1.0, seed: int = 42):
+    """Fills the scratch database with a skewed, reproducible dataset."""
+    rng = random.Random(seed)
+    size = {name: max(1, int(count * scale)) for name, count in DATASET.items()}
+    size["follows_per_user"] = DATASET["follows_per_user"]
+    cursor = conn.cursor()
+    now = datetime(2025, 1, 1)
+
+    def when(days: int = 365):
+        return now - timedelta(seconds=rng.randrange(days * 86400))
+
+    def popular(n: int):
+        """Random id in 1..n, skewed towards low ids (a few very popular rows)."""
+        return min(n, int(rng.paretovariate(1.2)))
+
+    cursor.execute("SELECT COALESCE(MAX(user_id), 0) FROM users")
+    first_user = cursor.fetchone()[0] + 1
+    insert_rows(cursor, "INSERT INTO users (username, email, hashed_password, created_at) VALUES (%s, %s, %s, %s)", [
+        (f"user{i:05d}", f"user{i:05d}@example.com", "x", when()) for i in range(size["users"])
+    ])
+    user_ids = list(range(first_user, first_user + size["users"]))
+
+    cursor.execute("SELECT COALESCE(MAX(category_id), 0) FROM categories")
+    first_tag = cursor.fetchone()[0] + 1
+    insert_rows(cursor, "INSERT INTO categories (name) VALUES (%s)", [
+        (f"tag{i:03d}",) for i in range(size["categories"])
+    ])
+    tag_ids = list(range(first_tag, first_tag + size["categories"]))
+
+    cursor.execute("SELECT COALESCE(MAX(post_id), 0) FROM posts")
+    first_post = cursor.fetchone()[0] + 1
+    insert_rows(cursor, "INSERT INTO posts (title, content, user_id, created_at) VALUES (%s, %s, %s, %s)", [
+        (f"Post {i} about databases", "lorem ipsum " * 20, user_ids[popular(len(user_ids)) - 1], when())
+        for i in range(size["posts"])
+    ])
+    post_ids = list(range(first_post, first_post + size["posts"]))
+
+    links = {(post_id, tag_ids[popular(len(tag_ids)) - 1]) for post_id in post_ids for _ in range(rng.randint(0, 3))}
+    insert_rows(cursor, "INSERT INTO post_categories (post_id, category_id) VALUES (%s, %s)", sorted(links))
+
+    follows = {
+        (follower, user_ids[popular(len(user_ids)) - 1])
+        for follower in user_ids for _ in range(size["follows_per_user"])
+    }
+    insert_rows(cursor, "INSERT INTO follows (follower_id, followed_id) VALUES (%s, %s)",
+                sorted((a, b) for a, b in follows if a != b))
+
+    likes = {(rng.choice(user_ids), post_ids[popular(len(post_ids)) - 1]) for _ in range(size["likes"])}
+    insert_rows(cursor, "INSERT INTO post_likes (user_id, post_id) VALUES (%s, %s)", sorted(likes))
+
+    insert_rows(cursor, "INSERT INTO comments (content, user_id, post_id, created_at) VALUES (%s, %s, %s, %s)", [
+        ("Nice post!", rng.choice(user_ids), post_ids[popular(len(post_ids)) - 1], when())
+        for _ in range(size["comments"])
+    ])
+    insert_rows(cursor, "INSERT INTO post_views (user_id, post_id, viewed_at) VALUES (%s, %s, %s)", [
+        (rng.choice(user_ids), post_ids[popular(len(post_ids)) - 1], when(30))
+        for _ in range(size["views"])
+    ])
+
+    insert_rows(cursor, "INSERT INTO collections (name, user_id) VALUES (%s, %s)", [
+        ("Saved", user_id) for user_id in user_ids
+    ])
+    cursor.execute("SELECT collection_id, user_id FROM collections")
+    collection_of = {user_id: collection_id for collection_id, user_id in cursor.fetchall()}
+    bookmarks = set()
+    for _ in range(size["bookmarks"]):
+        user_id = rng.choice(user_ids)
+        bookmarks.add((user_id, rng.choice(post_ids), collection_of[user_id]))
+    insert_rows(cursor, "INSERT INTO bookmarks (user_id, post_id, collection_id) VALUES (%s, %s, %s)", sorted(bookmarks))
+
+    # Precomputed "For you" candidates, as recommend.py would leave them
+    recommendations = {
+        (user_id, rng.choice(post_ids)): rng.random() for user_id in user_ids for _ in range(30)
+    }
+    insert_rows(cursor, "INSERT INTO user_recommendations (user_id, post_id, score) VALUES (%s, %s, %s)",
+                [(user_id, post_id, score) for (user_id, post_id), score in sorted(recommendations.items())])
+
+    # A few soft-deleted posts waiting for the purger, as in production
+    cursor.execute("UPDATE posts SET deleted_at = created_at WHERE MOD(post_id, 100) = 0")
+
+    conn.commit()
+    for table in ("users", "posts", "comments", "categories", "collections", "bookmarks",
+                  "follows", "post_likes", "post_categories", "post_views", "user_recommendations"):
+        cursor.execute(f"ANALYZE TABLE `{table}`")
+        cursor.fetchall()
+    cursor.close()
+
+
+# =================================================================
+#                          PLAN CASES
+# =================================================================
+
+def pick_params(cursor) -> dict:
+    """
+    Chooses 'heavy' ids so every case runs against its worst realistic input
+    (ties broken by id, so every run picks the same ones), and counts the
+    rows the `known` allowances are derived from.
+    """
+    def scalar(sql):
+        cursor.execute(sql)
+        return cursor.fetchone()[0]
+
+    params = {
+        "busy_follower": scalar("SELECT follower_id FROM follows GROUP BY follower_id ORDER BY COUNT(*) DESC, follower_id LIMIT 1"),
+        "popular_author": scalar("SELECT user_id FROM posts GROUP BY user_id ORDER BY COUNT(*) DESC, user_id LIMIT 1"),
+        "busy_post": scalar("SELECT post_id FROM comments GROUP BY post_id ORDER BY COUNT(*) DESC, post_id LIMIT 1"),
+        "bookmarker": scalar("SELECT user_id FROM bookmarks GROUP BY user_id ORDER BY COUNT(*) DESC, user_id LIMIT 1"),
+        "tag_name": scalar("SELECT name FROM categories ORDER BY post_count DESC, category_id LIMIT 1"),
+        # A page deep into the most popular tag (None if it has fewer posts)
+        "tag_before": scalar("""SELECT (SELECT pc.post_id FROM post_categories pc
+                                WHERE pc.category_id = (SELECT category_id FROM categories ORDER BY post_count DESC, category_id LIMIT 1)
+                                ORDER BY pc.post_id DESC LIMIT 1 OFFSET 200)"""),
+    }
+    params["collection"] = scalar(f"""SELECT collection_id FROM bookmarks WHERE user_id = {params['bookmarker']}
+                                      GROUP BY collection_id ORDER BY COUNT(*) DESC, collection_id LIMIT 1""")
+
+    # Sizes behind the known allowances
+    params["feed_follows"] = scalar(f"SELECT COUNT(*) FROM follows WHERE follower_id = {params['busy_follower']}")
+    # Index reads (and EXPLAIN's estimate) include deleted posts: deleted_at is filtered after the read
+    followed = f"SELECT followed_id FROM follows WHERE follower_id = {params['busy_follower']}"
+    params["feed_rows"] = scalar(f"SELECT COUNT(*) FROM posts WHERE user_id IN ({followed})")
+    params["feed_posts"] = scalar(f"SELECT COUNT(*) FROM posts WHERE user_id IN ({followed}) AND deleted_at IS NULL")
+    params["author_posts"] = scalar(f"SELECT COUNT(*) FROM posts WHERE user_id = {params['popular_author']}")
+    params["author_follows"] = scalar(f"""SELECT COUNT(*) FROM follows
+                                          WHERE followed_id = {params['popular_author']}
+                                             OR follower_id = {params['popular_author']}""")
+    return params
+
+
+def allowance(rows: int) -> int:
+    """A `known` limit for work that is expected to touch `rows` rows."""
+    return int(rows * KNOWN_MARGIN) + 50
+
+
+def plan_cases(p: dict):
+    """
+    The statements behind each procedure, mirrored from EchoDB.sql.
+    Keep them in sync when a procedure changes.
+
+    call: arguments for the real CALL (rows examined); cases without one
+          run `sql` as is
+    bodies: routine -> body_hash() of the body `sql` was copied from
+    expect_keys: table alias -> index that must be used
+    known: accepted problems -> (row limit, reason)
+    """
+    tag_before = "NULL" if p["tag_before"] is None else p["tag_before"]
+    return [
+        {
+            "procedure": "get_all_posts",
+            "call": [20, 0],
+            "bodies": {"get_all_posts": "d9f649016826"},
+            "sql": """SELECT p.post_id, p.title, p.content, p.created_at, p.user_id, p.likes_count,
+                             p.views_count, p.comments_count, u.username, u.email, u.created_at
+                      FROM posts p JOIN users u ON p.user_id = u.user_id
+                      WHERE p.deleted_at IS NULL
+                      ORDER BY p.created_at DESC LIMIT 20 OFFSET 0""",
+            "expect_keys": {"p": "idx_deleted_created", "u": "PRIMARY"},
+        },
+        {
+            "procedure": "get_post_details",
+            "call": [p['busy_post'], p['busy_follower']],
+            "bodies": {"get_post_details": "9b17d311a19e"},
+            "sql": f"""SELECT p.post_id, p.title, u.username,
+                              (SELECT COUNT(1) FROM post_likes pl WHERE pl.post_id = p.post_id AND pl.user_id = {p['busy_follower']}) > 0
+                       FROM posts p JOIN users u ON p.user_id = u.user_id
+                       WHERE p.post_id = {p['busy_post']} AND p.deleted_at IS NULL""",
+            "expect_keys": {"p": "PRIMARY", "u": "PRIMARY", "pl": "PRIMARY"},
+        },
+        {
+            "procedure": "sp_get_post_comments",
+            "call": [p['busy_post']],
+            "bodies": {"sp_get_post_comments": "dabddecd8788"},
+            "sql": f"""SELECT c.comment_id, c.content, c.created_at, c.parent_id, u.user_id, u.username
+                       FROM comments c JOIN users u ON c.user_id = u.user_id
+                       WHERE c.post_id = {p['busy_post']}
+                         AND EXISTS (SELECT 1 FROM posts p WHERE p.post_id = {p['busy_post']} AND p.deleted_at IS NULL)
+                       ORDER BY c.created_at ASC""",
+            "expect_keys": {"c": "idx_post_created", "u": "PRIMARY"},
+        },
+        {
+            "procedure": "sp_toggle_like",
+            "call": [p['busy_follower'], p['busy_post']],
+            "bodies": {"sp_toggle_like": "708d964dfd86"},
+            "sql": f"""SELECT EXISTS(SELECT 1 FROM posts WHERE post_id = {p['busy_post']} AND deleted_at IS NULL),
+                              (SELECT COUNT(1) FROM post_likes
+                               WHERE user_id = {p['busy_follower']} AND post_id = {p['busy_post']})""",
+            "expect_keys": {"posts": "PRIMARY", "post_likes": "PRIMARY"},
+        },
+        {
+            "procedure": "sp_get_user_profile",
+            "call": [p['popular_author']],
+            "bodies": {
+                "sp_get_user_profile": "4a2e61af4ebe",
+                "get_user_post_count": "3f046580393a",
+                "get_user_follower_count": "989c33ececd7",
+                "get_user_following_count": "6f8520ba4278",
+            },
+            "sql": f"""SELECT u.user_id, u.username,
+                              (SELECT COUNT(*) FROM posts WHERE user_id = u.user_id AND deleted_at IS NULL),
+                              (SELECT COUNT(*) FROM follows WHERE followed_id = u.user_id),
+                              (SELECT COUNT(*) FROM follows f2 WHERE f2.follower_id = u.user_id)
+                       FROM users u WHERE u.user_id = {p['popular_author']}""",
+            "expect_keys": {"u": "PRIMARY", "posts": "idx_user_created", "f2": "PRIMARY"},
+            # The three counts read one index entry per post, follower and followed user
+            "known": {"rows_examined": (
+                allowance(p["author_posts"] + p["author_follows"]),
+                "profile counts are COUNT(*) over the author's posts and follows",
+            )},
+        },
+        {
+            "procedure": "sp_get_user_posts",
+            "call": [p['popular_author'], 20, 0],
+            "bodies": {"sp_get_user_posts": "078c6226277a"},
+            "sql": f"""SELECT p.post_id, p.title, p.created_at FROM posts p
+                       WHERE p.user_id = {p['popular_author']} AND p.deleted_at IS NULL
+                       ORDER BY p.created_at DESC LIMIT 20 OFFSET 0""",
+            "expect_keys": {"p": "idx_user_created"},
+        },
+        {
+            "procedure": "sp_check_follow",
+            "call": [p['busy_follower'], p['popular_author']],
+            "bodies": {"sp_check_follow": "2c8fb97681bc"},
+            "sql": f"""SELECT EXISTS(SELECT 1 FROM follows
+                       WHERE follower_id = {p['busy_follower']} AND followed_id = {p['popular_author']})""",
+            "expect_keys": {"follows": "PRIMARY"},
+        },
+        {
+            "procedure": "sp_get_home_feed",
+            "call": [p['busy_follower'], 20, 0],
+            "bodies": {"sp_get_home_feed": "3747fdbf46f7"},
+            "sql": f"""SELECT p.post_id, p.title, p.created_at, u.username
+                       FROM posts p JOIN users u ON p.user_id = u.user_id
+                       WHERE p.user_id IN (SELECT followed_id FROM follows WHERE follower_id = {p['busy_follower']})
+                         AND p.deleted_at IS NULL
+                       ORDER BY p.created_at DESC LIMIT 20 OFFSET 0""",
+            "expect_keys": {"u": "PRIMARY"},
+            # Every live post of every followed author is joined and sorted to find
+            # the newest 20; anything beyond that (a scan, a second pass) fails
+            "known": {
+                "filesort": (allowance(p["feed_rows"]), "merges all followed authors' posts before LIMIT"),
+                "rows_examined": (
+                    allowance(p["feed_follows"] + p["feed_rows"] + p["feed_posts"]),
+                    "reads all followed authors' posts (and their authors) before LIMIT",
+                ),
+            },
+        },
+        {
+            "procedure": "sp_get_for_you_feed",
+            "call": [p['busy_follower'], 20, 0],
+            "bodies": {"sp_get_for_you_feed": "0a6ec2988174"},
+            "sql": f"""SELECT p.post_id, p.title, u.username, r.score
+                       FROM user_recommendations r
+                       JOIN posts p ON p.post_id = r.post_id
+                       JOIN users u ON p.user_id = u.user_id
+                       WHERE r.user_id = {p['busy_follower']} AND p.deleted_at IS NULL
+                         AND NOT EXISTS (SELECT 1 FROM post_likes pl
+                                         WHERE pl.user_id = {p['busy_follower']} AND pl.post_id = r.post_id)
+                       ORDER BY 0.7 * r.score + 0.3 * POW(0.5, TIMESTAMPDIFF(HOUR, p.created_at, NOW()) / 72) DESC,
+                                r.post_id DESC
+                       LIMIT 20 OFFSET 0""",
+            # The blended score is computed per row, so the user's candidates
+            # (at most recommend.TOP_K) are always sorted; that is bounded
+            "expect_keys": {"r": "PRIMARY", "p": "PRIMARY", "u": "PRIMARY"},
+        },
+        {
+            "procedure": "sp_search_posts",
+            "call": ["data"],
+            "bodies": {"sp_search_posts": "3c702aeaaedd"},
+            "sql": """SELECT p.post_id, p.title, u.username FROM posts p JOIN users u ON p.user_id = u.user_id
+                      WHERE (p.title LIKE '%data%' OR p.content LIKE '%data%') AND p.deleted_at IS NULL
+                      ORDER BY p.created_at DESC LIMIT 10""",
+            "expect_keys": {"u": "PRIMARY"},
+            "known": {
+                "full_scan": (10 ** 9, "LIKE '%q%' cannot use an index"),
+                "rows_examined": (10 ** 9, "LIKE '%q%' cannot use an index"),
+            },
+        },
+        {
+            "procedure": "sp_search_users",
+            "call": ["user001"],
+            "bodies": {"sp_search_users": "dd688370394a"},
+            "sql": "SELECT user_id, username, email, created_at FROM users WHERE username LIKE '%user001%' LIMIT 10",
+            "known": {
+                "full_scan": (10 ** 9, "LIKE '%q%' cannot use an index"),
+                "rows_examined": (10 ** 9, "LIKE '%q%' cannot use an index"),
+            },
+        },
+        {
+            "procedure": "sp_search_tags",
+            "call": ["tag"],
+            "bodies": {"sp_search_tags": "7f30383fba17"},
+            "sql": """SELECT category_id, name, post_count
+                      FROM categories c WHERE name LIKE '%tag%' ORDER BY post_count DESC LIMIT 10""",
+            "known": {
+                "full_scan": (10 ** 9, "LIKE '%q%' cannot use an index"),
+            },
+        },
+        {
+            "procedure": "sp_get_tag_posts",
+            "call": [p['tag_name'], p['tag_before'], 20],
+            "bodies": {"sp_get_tag_posts": "0aaee9e55b86"},
+            "sql": f"""SELECT p.post_id, p.title, u.username
+                       FROM categories c
+                       JOIN post_categories pc ON pc.category_id = c.category_id
+                       JOIN posts p ON p.post_id = pc.post_id
+                       JOIN users u ON p.user_id = u.user_id
+                       WHERE c.name = '{p['tag_name']}' AND pc.post_id < IFNULL({tag_before}, 2147483647)
+                         AND p.deleted_at IS NULL
+                       ORDER BY pc.post_id DESC LIMIT 20""",
+            "expect_keys": {"c": "name", "pc": "idx_category_post", "p": "PRIMARY", "u": "PRIMARY"},
+        },
+        {
+            "procedure": "purge.next_post",
+            "sql": purge.NEXT_POST_SQL,  # Not a procedure: checked as the purger runs it
+            "expect_keys": {"posts": "idx_deleted_created"},
+        },
+        {
+            "procedure": "sp_create_post",
+            "call": [p['popular_author'], "Plan check", "plan check", p['tag_name']],
+            "bodies": {"sp_create_post": "19ae9a12563b"},
+            "sql": f"SELECT category_id FROM categories WHERE name = '{p['tag_name']}'",
+            "expect_keys": {"categories": "name"},
+        },
+        {
+            "procedure": "sp_get_user_collections",
+            "call": [p['bookmarker']],
+            "bodies": {"sp_get_user_collections": "ed07f01ca65b"},
+            "sql": f"""SELECT collection_id, name,
+                              (SELECT COUNT(*) FROM bookmarks b JOIN posts p ON p.post_id = b.post_id
+                               WHERE b.collection_id = c.collection_id AND p.deleted_at IS NULL)
+                       FROM collections c WHERE user_id = {p['bookmarker']} ORDER BY name ASC""",
+            "expect_keys": {"c": "unique_user_collection"},
+        },
+        {
+            "procedure": "sp_check_bookmark_status",
+            "call": [p['bookmarker'], p['busy_post']],
+            "bodies": {"sp_check_bookmark_status": "b6a9c2dc1281"},
+            "sql": f"""SELECT b.collection_id FROM bookmarks b JOIN posts p ON p.post_id = b.post_id
+                       WHERE b.user_id = {p['bookmarker']} AND b.post_id = {p['busy_post']} AND p.deleted_at IS NULL""",
+            "expect_keys": {"b": "PRIMARY", "p": "PRIMARY"},
+        },
+        {
+            "procedure": "sp_get_posts_in_collection",
+            "call": [p['bookmarker'], p['collection']],
+            "bodies": {"sp_get_posts_in_collection": "7b647ed8f32d"},
+            "sql": f"""SELECT p.post_id, p.title, u.username FROM posts p
+                       JOIN users u ON p.user_id = u.user_id
+                       JOIN bookmarks b ON p.post_id = b.post_id
+                       WHERE b.user_id = {p['bookmarker']} AND b.collection_id = {p['collection']}
+                         AND p.deleted_at IS NULL
+                       ORDER BY b.created_at DESC""",
+            "expect_keys": {"p": "PRIMARY", "u": "PRIMARY"},
+        },
+    ]
+
+
+# =================================================================
+#                          PLAN ANALYSIS
+# =================================================================
+
+def walk_plan(node, tables, sorts):
+    """Collects table accesses and filesorts (with the rows they sort) from EXPLAIN JSON."""
+    if isinstance(node, list):
+        for item in node:
+            walk_plan(item, tables, sorts)
+        return
+    if not isinstance(node, dict):
+        return
+
+    if node.get("using_filesort"):
+        # The sort sees the largest join result produced underneath it
+        sort_tables = []
+        walk_plan({k: v for k, v in node.items() if k != "using_filesort"}, sort_tables, sorts)
+        sorts.append(max((t["rows_produced"] for t in sort_tables), default=0))
+        tables.extend(sort_tables)
+        return
+
+    table = node.get("table")
+    if isinstance(table, dict) and "table_name" in table:
+        tables.append({
+            "table": table["table_name"],
+            "access_type": table.get("access_type"),
+            "key": table.get("key"),
+            "rows_examined": int(table.get("rows_examined_per_scan", 0)),
+            "rows_produced": int(table.get("rows_produced_per_join", 0)),
+        })
+    for key, value in node.items():
+        walk_plan(value, tables, sorts)
+
+
+def body_hash(definition: str) -> str:
+    """Short hash of a routine body, ignoring comments and whitespace."""
+    text = re.sub(r"/\*.*?\*/", " ", definition, flags=re.DOTALL)
+    text = re.sub(r"--([ \t][^\n]*)?$", " ", text, flags=re.MULTILINE)
+    text = " ".join(text.split()).rstrip(";").strip()
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+def routine_hashes(cursor) -> dict:
+    """body_hash() of every procedure and function in the current database."""
+    cursor.execute("""SELECT ROUTINE_NAME, ROUTINE_DEFINITION FROM information_schema.ROUTINES
+                      WHERE ROUTINE_SCHEMA = DATABASE()""")
+    return {name: body_hash(definition or "") for name, definition in cursor.fetchall()}
+
+
+def rows_examined(conn, cursor, case: dict) -> int:
+    """
+    CALLs the procedure (or runs `sql` for cases without `call`) and returns
+    the rows the storage engine read for it. Anything it wrote is rolled back.
+    """
+    cursor.execute("FLUSH STATUS")
+    try:
+        if "call" in case:
+            cursor.callproc(case["procedure"], case["call"])
+            for result in cursor.stored_results():
+                result.fetchall()
+        else:
+            cursor.execute(case["sql"])
+            cursor.fetchall()
+        cursor.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+        return sum(int(value) for _, value in cursor.fetchall())
+    finally:
+        conn.rollback()
+
+
+def check_case(conn, cursor, case: dict, hashes: dict) -> dict:
+    cursor.execute("EXPLAIN FORMAT=JSON " + case["sql"])
+    plan = json.loads(cursor.fetchone()[0])
+    tables, sorts = [], []
+    walk_plan(plan, tables, sorts)
+
+    known = case.get("known", {})
+    full_scan_limit = known.get("full_scan", (FULL_SCAN_ROW_LIMIT, None))[0]
+    filesort_limit = known.get("filesort", (FILESORT_ROW_LIMIT, None))[0]
+    examined_limit = known.get("rows_examined", (ROWS_EXAMINED_LIMIT, None))[0]
+
+    failures = []
+    for routine, pinned in case.get("bodies", {}).items():
+        current = hashes.get(routine)
+        if current != pinned:
+            failures.append(f"{routine} changed (body hash {current}, case has {pinned}): "
+                            f"update this case's statement to match, then its hash")
+    for alias, index in case.get("expect_keys", {}).items():
+        # EXPLAIN reports aliases when the statement uses them
+        used = [t["key"] for t in tables if t["table"] == alias]
+        if index not in used:
+            failures.append(f"{alias}: expected index {index}, plan used {used or 'no access'}")
+    for t in tables:
+        if t["access_type"] in ("ALL", "index") and t["rows_examined"] > full_scan_limit:
+            failures.append(f"{t['table']}: full {'table' if t['access_type'] == 'ALL' else 'index'} scan "
+                            f"of ~{t['rows_examined']} rows (limit {full_scan_limit})")
+    for rows in sorts:
+        if rows > filesort_limit:
+            failures.append(f"filesort of ~{rows} rows (limit {filesort_limit})")
+
+    start = time.perf_counter()
+    examined = rows_examined(conn, cursor, case)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if examined > examined_limit:
+        failures.append(f"examined {examined} rows (limit {examined_limit})")
+
+    return {
+        "procedure": case["procedure"],
+        "ok": not failures,
+        "failures": failures,
+        "known": {kind: reason for kind, (_, reason) in known.items()},
+        "tables": tables,
+        "filesorts": sorts,
+        "rows_examined": examined,
+        "elapsed_ms": round(elapsed_ms, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=PLANCHECK_DB, help="scratch database (dropped and recreated)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the generated row counts")
+    parser.add_argument("--reuse", action="store_true", help="reuse the data from a previous run")
+    parser.add_argument("--report", help="write the full results as JSON to this file")
+    opts = parser.parse_args()
+
+    conn = mysql.connector.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST)
+    cursor = conn.cursor()
+    if opts.reuse:
+        cursor.execute(f"USE `{opts.database}`")
+    else:
+        start = time.perf_counter()
+        load_schema(cursor, opts.database)
+        conn.commit()
+        seed_dataset(conn, scale=opts.scale)
+        print(f"Loaded {opts.database} in {time.perf_counter() - start:.1f}s")
+
+    hashes = routine_hashes(cursor)
+    results = [check_case(conn, cursor, case, hashes) for case in plan_cases(pick_params(cursor))]
+    cursor.close()
+    conn.close()
+
+    print(f"{'procedure':<28}{'rows examined':>14}{'ms':>9}  result")
+    for result in results:
+        status = "ok" if result["ok"] else "FAIL"
+        if result["ok"] and result["known"]:
+            status = "ok (known: " + "; ".join(sorted(set(result["known"].values()))) + ")"
+        print(f"{result['procedure']:<28}{result['rows_examined']:>14}{result['elapsed_ms']:>9.1f}  {status}")
+        for failure in result["failures"]:
+            print(f"{'':<28}  - {failure}")
+
+    if opts.report:
+        Path(opts.report).write_text(json.dumps(results, indent=2, default=str), encoding="utf-8")
+
+    failed = [r["procedure"] for r in results if not r["ok"]]
+    if failed:
+        print(f"\n{len(failed)} plan regression(s): {', '.join(failed)}")
+        sys.exit(1)
+    print(f"\nAll {len(results)} procedure plans within thresholds.")
+
+
+if __name__ == "__main__":
+    main()
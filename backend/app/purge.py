@@ -0,0 +1,173 @@
+# app/purge.py
+"""
+Background purger for soft-deleted posts.
+
+sp_delete_post only stamps `posts.deleted_at`, so deleting a popular post
+is instant. This thread removes what is left behind, one post at a time:
+comments, likes, views and bookmarks go in batches of PURGE_BATCH_SIZE
+rows, each in its own short transaction, and the post row is deleted
+last.
+
+Comments are deleted newest-first, so replies go before the comments they
+answer and the parent_id cascade never deletes an unbounded thread.
+The ON DELETE CASCADE on posts still catches anything written to the
+post while it was being purged.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+import mysql.connector
+
+PURGE_BATCH_SIZE = 500
+PURGE_BATCH_PAUSE = 0.05  # Seconds between batches, so request traffic gets the locks
+PURGE_IDLE_INTERVAL = 30  # Seconds between checks when nothing is waiting
+
+# table -> ORDER BY used for its batches (dependents of a post, purged in this order)
+DEPENDENT_TABLES = [
+    ("comments", "created_at DESC, comment_id DESC"),  # Walks idx_post_created backwards
+    ("post_likes", "user_id"),
+    ("post_views", "view_id"),
+    ("bookmarks", "user_id"),
+    ("post_categories", "category_id"),  # Normally already removed by sp_delete_post
+]
+
+NEXT_POST_SQL = """
+    SELECT post_id FROM posts
+    WHERE deleted_at IS NOT NULL
+    ORDER BY deleted_at ASC, post_id ASC
+    LIMIT 1
+"""
+PENDING_SQL = "SELECT COUNT(*) FROM posts WHERE deleted_at IS NOT NULL"
+
+
+class Purger:
+    """Runs the purge loop on a daemon thread and keeps progress counters."""
+
+    def __init__(self, connect, batch_size: int = PURGE_BATCH_SIZE):
+        self.connect = connect  # Returns a new connection, or None (main.get_db_connection)
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Progress
+        self.state = "stopped"
+        self.current_post_id = None
+        self.current_table = None
+        self.posts_purged = 0
+        self.batches = 0
+        self.rows_deleted = {table: 0 for table, _ in DEPENDENT_TABLES}
+        self.pending = None
+        self.last_purged_at = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="echo-purger", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """Starts a pass now instead of waiting for the idle interval."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._set(state="running")
+            try:
+                self._purge_all()
+                self._set(state="idle", last_error=None)
+            except Exception as err:
+                # Keep the thread alive; the next pass retries
+                print(f"Error in purger: {err}")
+                self._set(state="error", last_error=str(err))
+            self._wake.wait(PURGE_IDLE_INTERVAL)
+            self._wake.clear()
+        self._set(state="stopped")
+
+    def _purge_all(self):
+        conn = self.connect()
+        if conn is None:
+            raise mysql.connector.Error("Could not connect to the database")
+        cursor = conn.cursor()
+        try:
+            while not self._stop.is_set():
+                cursor.execute(PENDING_SQL)
+                self._set(pending=cursor.fetchone()[0])
+                cursor.execute(NEXT_POST_SQL)
+                row = cursor.fetchone()
+                conn.commit()
+                if row is None:
+                    return
+                self._purge_post(conn, cursor, row[0])
+        finally:
+            self._set(current_post_id=None, current_table=None)
+            cursor.close()
+            if conn.is_connected():
+                conn.close()
+
+    def _purge_post(self, conn, cursor, post_id: int):
+        self._set(current_post_id=post_id)
+        for table, order_by in DEPENDENT_TABLES:
+            self._set(current_table=table)
+            while not self._stop.is_set():
+                cursor.execute(
+                    f"DELETE FROM `{table}` WHERE post_id = %s ORDER BY {order_by} LIMIT %s",
+                    (post_id, self.batch_size),
+                )
+                deleted = cursor.rowcount
+                conn.commit()
+                with self._lock:
+                    self.rows_deleted[table] += deleted
+                    self.batches += 1
+                if deleted < self.batch_size:
+                    break
+                time.sleep(PURGE_BATCH_PAUSE)
+            if self._stop.is_set():
+                return
+
+        # Only ever removes a post that is still marked deleted
+        cursor.execute("DELETE FROM posts WHERE post_id = %s AND deleted_at IS NOT NULL", (post_id,))
+        conn.commit()
+        with self._lock:
+            self.posts_purged += cursor.rowcount
+            self.pending = max((self.pending or 1) - 1, 0)
+            self.last_purged_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    def _set(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "pending_posts": self.pending,
+                "current_post_id": self.current_post_id,
+                "current_table": self.current_table,
+                "posts_purged": self.posts_purged,
+                "batches": self.batches,
+                "batch_size": self.batch_size,
+                "rows_deleted": dict(self.rows_deleted),
+                "last_purged_at": self.last_purged_at,
+                "last_error": self.last_error,
+            }
+
+
+PURGER = None
+
+
+def start(connect):
+    """Creates and starts the process-wide purger (called at app startup)."""
+    global PURGER
+    if PURGER is None:
+        PURGER = Purger(connect)
+    PURGER.start()
+    return PURGER
@@ -0,0 +1,244 @@
+# app/query.py
+"""
+Thin query-execution layer on top of mysql.connector.
+
+`cursor.callproc()` + `cursor.stored_results()` costs an extra result set
+(the CALL status) and a round of result-set bookkeeping on every call. For
+hot read procedures whose body is a single SELECT we can instead run that
+SELECT as a server-side prepared statement, which is parsed once per
+connection and then only re-executed with new parameters.
+
+That only pays off on a long-lived connection: on a fresh connection the
+first call costs a prepare, an execute and a close instead of one CALL.
+The API opens a connection per request, so get_runner runs with
+`use_prepared=False` (main.DB_USE_PREPARED); bench_query_layer.py shows
+both paths.
+"""
+import mysql.connector
+
+import cache
+import timing
+
+# Hot read procedures that are just one SELECT. Keep these in sync with
+# the procedure bodies in EchoDB.sql.
+PREPARED_PROCEDURES = {
+    'get_all_posts': """
+        SELECT
+            p.post_id, p.title, p.content, p.created_at,
+            p.user_id, p.likes_count, p.views_count, p.comments_count,
+            u.username, u.email AS user_email, u.created_at AS user_created_at
+        FROM posts p
+        JOIN users u ON p.user_id = u.user_id
+        WHERE p.deleted_at IS NULL
+        ORDER BY p.created_at DESC
+        LIMIT %s
+        OFFSET %s
+    """,
+    'sp_get_user_profile': """
+        SELECT
+            u.user_id, u.username, u.email, u.created_at,
+            get_user_post_count(u.user_id) AS post_count,
+            get_user_follower_count(u.user_id) AS follower_count,
+            get_user_following_count(u.user_id) AS following_count
+        FROM users u
+        WHERE u.user_id = %s
+    """,
+    'sp_get_user_posts': """
+        SELECT
+            p.post_id, p.title, p.content, p.created_at,
+            p.user_id, p.likes_count, p.views_count, p.comments_count
+        FROM posts p
+        WHERE p.user_id = %s AND p.deleted_at IS NULL
+        ORDER BY p.created_at DESC
+        LIMIT %s
+        OFFSET %s
+    """,
+    'sp_get_tag_posts': """
+        SELECT
+            p.post_id, p.title, p.content, p.created_at,
+            p.user_id, p.likes_count, p.views_count, p.comments_count,
+            u.username
+        FROM categories c
+        JOIN post_categories pc ON pc.category_id = c.category_id
+        JOIN posts p ON p.post_id = pc.post_id
+        JOIN users u ON p.user_id = u.user_id
+        WHERE c.name = %s
+          AND pc.post_id < IFNULL(%s, 2147483647)
+          AND p.deleted_at IS NULL
+        ORDER BY pc.post_id DESC
+        LIMIT %s
+    """,
+}
+
+
+def run_after_commit(callbacks: list):
+    """
+    Runs and clears after-commit callbacks (in-memory index updates and the
+    like). The data is already committed, so a failing callback is only logged.
+    """
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            print(f"Error in after-commit callback: {e}")
+    callbacks.clear()
+
+
+def driver_name(conn) -> str:
+    """Returns which protocol implementation a connection is using."""
+    try:
+        from mysql.connector.connection_cext import CMySQLConnection
+    except ImportError:
+        return "pure"
+    return "c-ext" if isinstance(conn, CMySQLConnection) else "pure"
+
+
+class QueryRunner:
+    """
+    Wraps one connection and caches a prepared cursor per SQL statement,
+    so each statement is only prepared once for the life of the connection.
+
+    The connection comes from `connect` (a zero-argument factory) and is
+    only opened on the first cache miss or write, so a request answered
+    entirely from the result cache never touches MySQL. The caller closes
+    `conn` afterwards if one was opened.
+
+    Under REPEATABLE READ every read in a transaction sees the snapshot
+    taken by its first read, so the result-cache fill token is taken
+    before that first read and shared by every fill until the commit;
+    rows are not cached if a write was invalidated after the snapshot.
+    """
+
+    def __init__(self, connect, use_prepared: bool = True, result_cache=cache.RESULT_CACHE):
+        self._connect = connect
+        self.conn = None
+        self.use_prepared = use_prepared
+        self.result_cache = result_cache
+        self._cursor = None
+        self._prepared = {}  # sql -> (prepared cursor, sql)
+        self._pending_invalidations = set()
+        self._fill_token = None  # Result-cache token for the current transaction's snapshot
+        self.after_commit = []  # Callbacks run once the transaction has committed
+
+    def _connection(self):
+        """
+        Opens the connection (and the plain cursor) on first use. Called
+        before every statement, so it also takes the fill token before the
+        first read of each transaction.
+        """
+        if self._fill_token is None and self.result_cache is not None:
+            self._fill_token = self.result_cache.begin_fill()
+        if self.conn is None:
+            self.conn = self._connect()
+            self._cursor = self.conn.cursor(dictionary=True)
+        return self.conn
+
+    def _end_transaction(self):
+        if self._fill_token is not None:
+            self.result_cache.end_fill(self._fill_token)
+            self._fill_token = None
+
+    def call(self, proc_name: str, args=()):
+        """
+        Runs a procedure and returns the rows of its last result set.
+        Cacheable procedures are answered from the result cache when possible;
+        write procedures queue cache invalidations that apply on commit.
+        """
+        policy = cache.CACHE_POLICIES.get(proc_name) if self.result_cache is not None else None
+        if policy is None:
+            rows = self._execute(proc_name, args)
+            invalidation = cache.INVALIDATIONS.get(proc_name)
+            if invalidation is not None:
+                self._pending_invalidations |= invalidation(args)
+            return rows
+
+        key = self.result_cache.make_key(proc_name, args)
+        rows = self.result_cache.get(key)
+        if rows is not None:
+            timing.record_call(proc_name, args, len(rows), 0.0, 0.0, cached=True)
+        else:
+            rows = self._execute(proc_name, args)
+            ttl, tags_for = policy
+            # Dropped if a write was invalidated after this transaction's snapshot
+            self.result_cache.set(key, rows, ttl, tags_for(args, rows), self._fill_token)
+        return rows
+
+    def _execute(self, proc_name: str, args):
+        """Uses the prepared SELECT when one is registered, otherwise CALLs the procedure."""
+        sql = PREPARED_PROCEDURES.get(proc_name) if self.use_prepared else None
+        if sql is not None:
+            rows, proc_time, fetch_time = self._run_prepared(sql, args)
+        else:
+            self._connection()
+            with timing.phase("proc") as proc_timer:
+                self._cursor.callproc(proc_name, list(args))
+            with timing.phase("fetch") as fetch_timer:
+                rows = []
+                for result in self._cursor.stored_results():
+                    rows = result.fetchall()
+            proc_time, fetch_time = proc_timer.elapsed, fetch_timer.elapsed
+        timing.record_call(proc_name, args, len(rows), proc_time, fetch_time)
+        return rows
+
+    def call_one(self, proc_name: str, args=()):
+        """Like `call`, but returns only the first row (or None)."""
+        rows = self.call(proc_name, args)
+        return rows[0] if rows else None
+
+    def fetch_all(self, sql: str, args=()):
+        """Executes `sql` (prepared when use_prepared is on) and returns dict rows."""
+        if self.use_prepared:
+            return self._run_prepared(sql, args)[0]
+        self._connection()
+        with timing.phase("proc"):
+            self._cursor.execute(sql, tuple(args))
+        with timing.phase("fetch"):
+            return self._cursor.fetchall()
+
+    def _run_prepared(self, sql: str, args):
+        """Returns (rows, execute seconds, fetch seconds) for a prepared statement."""
+        conn = self._connection()
+        cached = self._prepared.get(sql)
+        if cached is None:
+            cached = (conn.cursor(prepared=True), sql)
+            self._prepared[sql] = cached
+        # The prepared cursor only re-uses its statement when it is handed the
+        # *same* string object it prepared, so always pass the cached one.
+        cursor, sql = cached
+        with timing.phase("proc") as proc_timer:
+            cursor.execute(sql, tuple(args))
+        with timing.phase("fetch") as fetch_timer:
+            columns = cursor.column_names
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return rows, proc_timer.elapsed, fetch_timer.elapsed
+
+    def commit(self):
+        """Commits, then drops the cache entries affected by this transaction's writes."""
+        if self.conn is not None:
+            with timing.phase("commit"):
+                self.conn.commit()
+        self._end_transaction()
+        if self._pending_invalidations and self.result_cache is not None:
+            self.result_cache.invalidate(self._pending_invalidations)
+        self._pending_invalidations.clear()
+        run_after_commit(self.after_commit)
+
+    def rollback(self):
+        if self.conn is not None:
+            self.conn.rollback()
+        self._end_transaction()
+        self._pending_invalidations.clear()
+        self.after_commit.clear()
+
+    def close(self):
+        """Closes the plain cursor and deallocates every prepared statement."""
+        for cursor, _ in self._prepared.values():
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+        self._prepared.clear()
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+        self._end_transaction()
@@ -0,0 +1,275 @@
+# app/recommend.py
+"""
+Batch job that precomputes the "For you" feed.
+
+1. Builds a sparse user x post matrix from likes, bookmarks and views
+   (live posts only). Each interaction type has its own weight; repeat
+   views count logarithmically.
+2. Computes item-item cosine similarity in column chunks and keeps the
+   NEIGHBOURS most similar posts per post.
+3. Scores every user's unseen posts (interactions x neighbour matrix),
+   in row chunks. It keeps the TOP_K best per user, excluding the
+   user's own posts, with scores scaled to 0..1.
+4. Writes them to a fresh copy of `user_recommendations` and swaps it
+   in with one RENAME, so the feed never sees a half-written table.
+
+sp_get_for_you_feed blends these scores with post freshness.
+
+Run it periodically (e.g. from cron), from backend/app:
+    python recommend.py                      # against the app database
+    python recommend.py --generate           # on the plan_check dataset (ECHO_PLANCHECK)
+    python recommend.py --generate --scale 5 --report recommend.json
+"""
+import argparse
+import json
+import resource
+import time
+import tracemalloc
+
+import mysql.connector
+import numpy as np
+import scipy.sparse as sp
+
+import plan_check
+from main import DB_USER, DB_PASSWORD, DB_HOST, DB_NAME
+
+LIKE_WEIGHT = 3.0
+BOOKMARK_WEIGHT = 4.0
+VIEW_WEIGHT = 1.0  # x log(1 + views)
+
+NEIGHBOURS = 50   # Similar posts kept per post
+TOP_K = 100       # Candidates stored per user
+BLOCK_BYTES = 64 * 1024 * 1024  # Memory budget for each chunk
+# Per cell of a chunk: the sparse product before densifying (~12 B), the
+# float32 block (4 B) and argpartition's int64 indices (8 B), with headroom
+BYTES_PER_CELL = 32
+FETCH_BATCH = 50000
+INSERT_BATCH = 5000
+
+# (sql returning user_id, post_id, count, weight, count is log-scaled)
+INTERACTION_SOURCES = [
+    ("""SELECT pl.user_id, pl.post_id, 1
+        FROM post_likes pl JOIN posts p ON p.post_id = pl.post_id
+        WHERE p.deleted_at IS NULL""", LIKE_WEIGHT, False),
+    # A post saved to several collections counts once
+    ("""SELECT DISTINCT b.user_id, b.post_id, 1
+        FROM bookmarks b JOIN posts p ON p.post_id = b.post_id
+        WHERE p.deleted_at IS NULL""", BOOKMARK_WEIGHT, False),
+    ("""SELECT v.user_id, v.post_id, COUNT(*)
+        FROM post_views v JOIN posts p ON p.post_id = v.post_id
+        WHERE v.user_id IS NOT NULL AND p.deleted_at IS NULL
+        GROUP BY v.user_id, v.post_id""", VIEW_WEIGHT, True),
+]
+AUTHORS_SQL = "SELECT post_id, user_id FROM posts WHERE deleted_at IS NULL"
+
+
+def fetch_columns(cursor, sql: str, columns: int):
+    """Runs `sql` and returns its rows as one int64 array of shape (rows, columns)."""
+    cursor.execute(sql)
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH)
+        if not rows:
+            break
+        chunks.append(np.asarray(rows, dtype=np.int64))
+    return np.concatenate(chunks) if chunks else np.empty((0, columns), dtype=np.int64)
+
+
+def build_matrix(conn):
+    """
+    Returns (X, user_ids, post_ids, post_authors): X is a CSR float32
+    matrix, with rows mapping to `user_ids` and columns to `post_ids`.
+    """
+    cursor = conn.cursor()
+    users, posts, weights = [], [], []
+    for sql, weight, log_scaled in INTERACTION_SOURCES:
+        rows = fetch_columns(cursor, sql, 3)
+        users.append(rows[:, 0])
+        posts.append(rows[:, 1])
+        weights.append(weight * (np.log1p(rows[:, 2]) if log_scaled else rows[:, 2]))
+    authors = fetch_columns(cursor, AUTHORS_SQL, 2)
+    cursor.close()
+
+    user_ids, user_index = np.unique(np.concatenate(users), return_inverse=True)
+    post_ids, post_index = np.unique(np.concatenate(posts), return_inverse=True)
+    # Duplicate (user, post) pairs from different sources are summed
+    X = sp.csr_matrix(
+        (np.concatenate(weights).astype(np.float32), (user_index, post_index)),
+        shape=(len(user_ids), len(post_ids)),
+    )
+
+    order = np.argsort(authors[:, 0])
+    post_authors = authors[order, 1][np.searchsorted(authors[order, 0], post_ids)]
+    return X, user_ids, post_ids, post_authors
+
+
+def item_neighbours(X, neighbours: int = NEIGHBOURS):
+    """
+    Item-item cosine similarity, pruned to the `neighbours` most similar
+    posts per post. Returns a CSR matrix S (posts x posts) where S[i, j]
+    is the similarity of post i to post j.
+    """
+    n_posts = X.shape[1]
+    k = min(neighbours, n_posts - 1)
+    if k <= 0:
+        return sp.csr_matrix((n_posts, n_posts), dtype=np.float32)
+
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0), dtype=np.float32)).ravel()
+    norms[norms == 0] = 1.0
+    Xn = (X @ sp.diags(1.0 / norms)).astype(np.float32).tocsc()
+    XnT = Xn.T.tocsr()
+
+    chunk = max(1, BLOCK_BYTES // (n_posts * BYTES_PER_CELL))
+    rows, cols, vals = [], [], []
+    for start in range(0, n_posts, chunk):
+        stop = min(start + chunk, n_posts)
+        block = (XnT @ Xn[:, start:stop]).toarray()  # Every post against the posts in this chunk
+        block[np.arange(start, stop), np.arange(stop - start)] = 0.0  # Not its own neighbour
+        top = np.argpartition(block, n_posts - k, axis=0)[n_posts - k:]  # k largest per column
+        top_vals = np.take_along_axis(block, top, axis=0)
+        keep = top_vals > 0
+        rows.append(top[keep])
+        cols.append(np.broadcast_to(np.arange(start, stop), top.shape)[keep])
+        vals.append(top_vals[keep])
+
+    return sp.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_posts, n_posts),
+    )
+
+
+def top_candidates(X, S, user_ids, post_ids, post_authors, top_k: int = TOP_K):
+    """Yields (user_ids, post_ids, scores) arrays, one chunk of users at a time."""
+    n_users, n_posts = X.shape
+    k = min(top_k, n_posts)
+    if k == 0:
+        return
+    chunk = max(1, BLOCK_BYTES // (n_posts * BYTES_PER_CELL))
+    for start in range(0, n_users, chunk):
+        stop = min(start + chunk, n_users)
+        Xc = X[start:stop]
+        scores = (Xc @ S).toarray()
+        # Nothing the user has already interacted with, and none of their own posts
+        scores[Xc.nonzero()] = 0.0
+        scores[post_authors[None, :] == user_ids[start:stop, None]] = 0.0
+
+        top = np.argpartition(scores, n_posts - k, axis=1)[:, n_posts - k:]  # k largest per row
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        best = top_scores.max(axis=1, keepdims=True)
+        top_scores = top_scores / np.where(best > 0, best, 1.0)  # 0..1 per user
+
+        keep = top_scores > 0
+        chunk_users = np.broadcast_to(user_ids[start:stop, None], top.shape)
+        yield chunk_users[keep], post_ids[top[keep]], top_scores[keep]
+
+
+def write_recommendations(conn, candidates) -> int:
+    """Fills a staging copy of user_recommendations and swaps it in atomically."""
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS user_recommendations_new")
+    cursor.execute("CREATE TABLE user_recommendations_new LIKE user_recommendations")
+    sql = "INSERT INTO user_recommendations_new (user_id, post_id, score) VALUES (%s, %s, %s)"
+    written = 0
+    for users, posts, scores in candidates:
+        rows = list(zip(users.tolist(), posts.tolist(), scores.tolist()))
+        for start in range(0, len(rows), INSERT_BATCH):
+            cursor.executemany(sql, rows[start:start + INSERT_BATCH])
+        conn.commit()
+        written += len(rows)
+
+    cursor.execute("DROP TABLE IF EXISTS user_recommendations_old")
+    cursor.execute(
+        "RENAME TABLE user_recommendations TO user_recommendations_old, "
+        "user_recommendations_new TO user_recommendations"
+    )
+    cursor.execute("DROP TABLE user_recommendations_old")
+    cursor.close()
+    return written
+
+
+def run(conn, neighbours: int = NEIGHBOURS, top_k: int = TOP_K, dry_run: bool = False) -> dict:
+    """Runs the whole job and returns timings, sizes and memory use."""
+    tracemalloc.start()
+    timings = {}
+    start = time.perf_counter()
+
+    X, user_ids, post_ids, post_authors = build_matrix(conn)
+    timings["load_matrix_s"] = time.perf_counter() - start
+
+    phase_start = time.perf_counter()
+    S = item_neighbours(X, neighbours)
+    timings["similarity_s"] = time.perf_counter() - phase_start
+
+    phase_start = time.perf_counter()
+    candidates = top_candidates(X, S, user_ids, post_ids, post_authors, top_k)
+    if dry_run:
+        written = sum(len(users) for users, _, _ in candidates)
+    else:
+        written = write_recommendations(conn, candidates)
+    # Scoring is lazy, so this covers both scoring and writing
+    timings["score_and_write_s"] = time.perf_counter() - phase_start
+    timings["total_s"] = time.perf_counter() - start
+
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n_users, n_posts = X.shape
+    return {
+        "users": n_users,
+        "posts": n_posts,
+        "interactions": int(X.nnz),
+        "density": round(X.nnz / (n_users * n_posts), 6) if n_users and n_posts else 0.0,
+        "neighbour_pairs": int(S.nnz),
+        "recommendations": int(written),
+        "dry_run": dry_run,
+        "timings": {name: round(seconds, 3) for name, seconds in timings.items()},
+        "peak_traced_mb": round(traced_peak / 2 ** 20, 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help=f"database to read and write (default {DB_NAME})")
+    parser.add_argument("--generate", action="store_true",
+                        help="rebuild the plan_check dataset and run against it "
+                             f"(always {plan_check.PLANCHECK_DB}; cannot be combined with --database)")
+    parser.add_argument("--scale", type=float, default=1.0, help="dataset scale for --generate")
+    parser.add_argument("--neighbours", type=int, default=NEIGHBOURS)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--dry-run", action="store_true", help="compute but do not write")
+    parser.add_argument("--report", help="write the results as JSON to this file")
+    opts = parser.parse_args()
+    if opts.generate and opts.database:
+        parser.error(f"--generate always uses {plan_check.PLANCHECK_DB}; drop --database")
+
+    if opts.generate:
+        conn = mysql.connector.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST)
+        cursor = conn.cursor()
+        plan_check.load_schema(cursor, plan_check.PLANCHECK_DB)
+        cursor.close()
+        conn.commit()
+        plan_check.seed_dataset(conn, scale=opts.scale)
+    else:
+        conn = mysql.connector.connect(user=DB_USER, password=DB_PASSWORD, host=DB_HOST,
+                                       database=opts.database or DB_NAME)
+
+    try:
+        result = run(conn, opts.neighbours, opts.top_k, opts.dry_run)
+    finally:
+        conn.close()
+
+    print(f"{result['users']} users x {result['posts']} posts, {result['interactions']} interactions "
+          f"(density {result['density']}), {result['neighbour_pairs']} neighbour pairs")
+    print(f"{result['recommendations']} recommendations {'computed' if opts.dry_run else 'written'}")
+    for name, seconds in result["timings"].items():
+        print(f"  {name:<20}{seconds:>9.3f}")
+    print(f"Peak memory: {result['peak_traced_mb']} MB traced, {result['peak_rss_mb']} MB RSS")
+
+    if opts.report:
+        with open(opts.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -174,6 +174,15 @@ class SearchResults(BaseModel):
     users: List[UserSearchResult]
     tags: List[TagSearchResult]
 
+class TypeaheadUser(BaseModel):
+    user_id: int
+    username: str
+    follower_count: int
+
+class TypeaheadResults(BaseModel):
+    users: List[TypeaheadUser]
+    tags: List[TagSearchResult]
+
 
 class Notification(BaseModel):
     notification_id: int
@@ -187,4 +196,15 @@ class Notification(BaseModel):
     post_title: Optional[str] = None
 
 class UnreadCount(BaseModel):
-    unread_count: int
\ No newline at end of file
+    unread_count: int
+
+class ViewerStateRequest(BaseModel):
+    user_id: int
+    post_ids: List[int]
+
+class PostViewerState(BaseModel):
+    post_id: int
+    author_id: int
+    is_liked: bool
+    bookmarked_collection_ids: List[int]
+    is_following_author: bool
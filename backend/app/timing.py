@@ -0,0 +1,310 @@
+# app/timing.py
+"""
+Per-request phase timing and slow-request traces.
+
+Every request gets a RequestTrace (held in a context variable, so the
+threadpool that runs sync endpoints and dependencies sees the same one).
+The database layer adds time to these phases:
+
+    db-connect  opening the connection in get_db_connection()
+    proc        callproc / execute, until MySQL answers
+    fetch       fetchone / fetchall, turning rows into Python objects
+    commit      committing at the end of the request
+
+TimedRoute adds the FastAPI side, and admission control adds `queue`:
+
+    queue       waiting for an admission slot
+    validate    request parsing, body validation and dependencies (minus db-connect)
+    endpoint    our own Python code in the endpoint (minus proc/fetch)
+    serialize   response_model validation and JSON encoding
+
+The phases are sent back in a Server-Timing header. Requests slower than
+SLOW_REQUEST_MS are sampled into a bounded ring buffer together with the
+procedures they called, their row counts and the shape of their arguments
+(numbers as-is; strings, which can be emails, passwords or post text, only
+by length).
+"""
+import contextvars
+import inspect
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from functools import wraps
+
+from fastapi.routing import APIRoute
+
+SLOW_REQUEST_MS = 250
+SLOW_SAMPLE_RATE = 1.0  # Fraction of slow requests kept; lower it if the buffer churns
+MAX_SLOW_REQUESTS = 200
+MAX_CALLS_PER_TRACE = 50
+
+# Order of the entries in the Server-Timing header
+PHASES = ("queue", "db-connect", "validate", "proc", "fetch", "endpoint", "serialize", "commit")
+DB_PHASES = ("queue", "db-connect", "proc", "fetch", "commit")
+
+_current_trace = contextvars.ContextVar("echo_request_trace", default=None)
+
+_slow_requests = deque(maxlen=MAX_SLOW_REQUESTS)
+_slow_lock = threading.Lock()
+_slow_seen = 0
+
+
+class RequestTrace:
+    """Phase timings and database calls for one request."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.calls = []
+        self.db_seconds = 0.0  # Running total of the DB phases, used to split route time
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] += seconds
+        if phase in DB_PHASES:
+            self.db_seconds += seconds
+
+    def add_call(self, procedure: str, args=()):
+        """Records a procedure or statement; returns the entry so rows/fetch time can be added."""
+        call = {"procedure": procedure, "args": _safe_args(args), "rows": 0, "proc_ms": 0.0, "fetch_ms": 0.0}
+        if len(self.calls) < MAX_CALLS_PER_TRACE:
+            self.calls.append(call)
+        return call
+
+    def header(self, total: float) -> str:
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items() if seconds > 0]
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+def _safe_args(args):
+    """Log-safe copies of the call arguments: ids and numbers kept, anything else reduced to type and length."""
+    safe = []
+    for arg in args or ():
+        if isinstance(arg, (int, float, type(None))):
+            safe.append(arg)
+        elif isinstance(arg, (str, bytes)):
+            safe.append(f"<{type(arg).__name__}:{len(arg)}>")
+        else:
+            safe.append(f"<{type(arg).__name__}>")
+    return safe
+
+
+def start_request(method: str, path: str):
+    trace = RequestTrace(method, path)
+    return trace, _current_trace.set(trace)
+
+
+def end_request(token):
+    _current_trace.reset(token)
+
+
+class phase:
+    """Context manager that adds its elapsed time to a phase of the current request."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.name, self.elapsed)
+        return False
+
+
+def record_call(procedure: str, args, rows: int, proc_seconds: float, fetch_seconds: float, cached: bool = False):
+    """Records one finished call (used by QueryRunner, which times both phases itself)."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    call = trace.add_call(procedure, args)
+    call.update(rows=rows, proc_ms=round(proc_seconds * 1000, 3), fetch_ms=round(fetch_seconds * 1000, 3))
+    if cached:
+        call["cached"] = True
+
+
+# =================================================================
+#                          CURSOR PROXY
+# =================================================================
+
+class _TracedResult:
+    """Wraps one result of stored_results() so its fetches are timed."""
+
+    def __init__(self, result, call):
+        self._result = result
+        self._call = call
+
+    def _fetch(self, method, *args):
+        with phase("fetch") as timer:
+            rows = getattr(self._result, method)(*args)
+        if self._call is not None:
+            self._call["fetch_ms"] = round(self._call["fetch_ms"] + timer.elapsed * 1000, 3)
+            self._call["rows"] += len(rows) if isinstance(rows, list) else int(rows is not None)
+        return rows
+
+    def fetchall(self):
+        return self._fetch("fetchall")
+
+    def fetchone(self):
+        return self._fetch("fetchone")
+
+    def fetchmany(self, size=1):
+        return self._fetch("fetchmany", size)
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+
+class TracedCursor(_TracedResult):
+    """
+    Cursor proxy handed out by get_db(): times callproc/execute as `proc`
+    and every fetch as `fetch`, and records each call on the request trace.
+    Everything else (lastrowid, rowcount, close ...) goes to the real cursor.
+    """
+
+    def __init__(self, cursor):
+        super().__init__(cursor, None)
+
+    def _start_call(self, procedure, args):
+        trace = _current_trace.get()
+        self._call = trace.add_call(procedure, args) if trace is not None else None
+
+    def _end_proc(self, timer):
+        if self._call is not None:
+            self._call["proc_ms"] = round(timer.elapsed * 1000, 3)
+
+    def callproc(self, proc_name, args=()):
+        self._start_call(proc_name, args)
+        with phase("proc") as timer:
+            result = self._result.callproc(proc_name, args)
+        self._end_proc(timer)
+        return result
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        # Statements are recorded by their first 80 characters, which is enough to tell them apart
+        self._start_call(" ".join(operation.split())[:80], params)
+        with phase("proc") as timer:
+            result = self._result.execute(operation, params, *args, **kwargs)
+        self._end_proc(timer)
+        return result
+
+    def stored_results(self):
+        for result in self._result.stored_results():
+            yield _TracedResult(result, self._call)
+
+
+# =================================================================
+#                          ROUTE + MIDDLEWARE
+# =================================================================
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute that marks when the endpoint starts and ends, so the rest of
+    the route's time can be split into `validate` (before) and `serialize` (after).
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            trace = _current_trace.get()
+            if trace is None:
+                return await handler(request)
+            trace.route_start = time.perf_counter()
+            response = await handler(request)
+            route_end = time.perf_counter()
+
+            endpoint_start = getattr(trace, "endpoint_start", None)
+            endpoint_end = getattr(trace, "endpoint_end", None)
+            if endpoint_start is not None and endpoint_end is not None:
+                before = endpoint_start - trace.route_start - trace.db_before_endpoint
+                after = route_end - endpoint_end - (trace.db_seconds - trace.db_after_endpoint)
+                trace.add("validate", max(before, 0.0))
+                trace.add("serialize", max(after, 0.0))
+            return response
+
+        return timed_handler
+
+
+def _timed_endpoint(endpoint):
+    """Wraps an endpoint (keeping its signature for FastAPI) to record its own Python time."""
+
+    def begin():
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.endpoint_start = time.perf_counter()
+            trace.db_before_endpoint = trace.db_seconds
+        return trace
+
+    def finish(trace):
+        if trace is None:
+            return
+        trace.endpoint_end = time.perf_counter()
+        trace.db_after_endpoint = trace.db_seconds
+        db_inside = trace.db_after_endpoint - trace.db_before_endpoint
+        trace.add("endpoint", max(trace.endpoint_end - trace.endpoint_start - db_inside, 0.0))
+
+    if inspect.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def timed(*args, **kwargs):
+            trace = begin()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                finish(trace)
+    else:
+        @wraps(endpoint)
+        def timed(*args, **kwargs):
+            trace = begin()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                finish(trace)
+    return timed
+
+
+def finish_request(trace: RequestTrace, status_code: int) -> str:
+    """Builds the Server-Timing header and samples the request if it was slow."""
+    global _slow_seen
+    total = time.perf_counter() - trace.started
+    header = trace.header(total)
+    total_ms = total * 1000
+    if total_ms >= SLOW_REQUEST_MS:
+        with _slow_lock:
+            _slow_seen += 1
+            if random.random() < SLOW_SAMPLE_RATE:
+                _slow_requests.append({
+                    "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                    "method": trace.method,
+                    "path": trace.path,
+                    "status": status_code,
+                    "total_ms": round(total_ms, 3),
+                    "phases_ms": {name: round(s * 1000, 3) for name, s in trace.phases.items() if s > 0},
+                    "calls": trace.calls,
+                })
+    return header
+
+
+def slow_requests(limit: int = 50) -> dict:
+    """The most recent sampled slow requests, newest first."""
+    with _slow_lock:
+        recent = list(_slow_requests)[-limit:][::-1] if limit > 0 else []
+        return {
+            "threshold_ms": SLOW_REQUEST_MS,
+            "sample_rate": SLOW_SAMPLE_RATE,
+            "slow_seen": _slow_seen,
+            "buffered": len(_slow_requests),
+            "capacity": MAX_SLOW_REQUESTS,
+            "requests": recent,
+        }
@@ -0,0 +1,296 @@
+# app/typeahead.py
+"""
+In-memory prefix index for the explore search box.
+
+`LIKE '%q%'` cannot use the username or category name indexes, so
+suggestions are served from memory instead: each index keeps its names
+lower-cased in a sorted list, and a prefix is the slice between two
+bisects. Users rank by follower count and tags by post count.
+
+Short prefixes can match a large share of all names, so every prefix
+matching more than HEAVY_PREFIX_SIZE names keeps a precomputed list of
+its best TOP_CANDIDATES; any other prefix matches few enough names to
+rank on the fly. Either way a keystroke costs well under a millisecond.
+
+Updates only touch those bounded lists. Every name left off a list ranks
+no better than its last entry, so a new or raised score is merged in,
+and a listed name whose score falls below that bound drops off. A list
+that shrinks below REFILL_BELOW is refilled by a background thread,
+which ranks the whole prefix without holding the index lock.
+
+The indexes are loaded at startup, updated on signup, tag creation and
+follow toggles, and fully reloaded every TYPEAHEAD_RELOAD_SECONDS to
+catch everything else (deleted posts, unfollows from other processes).
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+MAX_SUGGESTIONS = 10
+TOP_CANDIDATES = 50  # Kept per heavy prefix: MAX_SUGGESTIONS plus slack for score drops
+REFILL_BELOW = 25    # A list this short is refilled in the background, before it runs out
+HEAVY_PREFIX_SIZE = 256
+TYPEAHEAD_RELOAD_SECONDS = 600
+
+USERS_SQL = """
+    SELECT u.user_id, u.username, COUNT(f.follower_id) AS follower_count
+    FROM users u
+    LEFT JOIN follows f ON f.followed_id = u.user_id
+    GROUP BY u.user_id, u.username
+"""
+TAGS_SQL = "SELECT category_id, name, post_count FROM categories"
+TAG_BY_NAME_SQL = "SELECT category_id, name, post_count FROM categories WHERE name = %s"
+
+
+class PrefixIndex:
+    """Sorted (key, id) pairs with a score per id; answers ranked prefix queries."""
+
+    def __init__(self, name_field: str, score_field: str):
+        self.name_field = name_field
+        self.score_field = score_field
+        self._keys = []    # sorted (lower-cased name, id)
+        self._items = {}   # id -> row dict (id field, name field, score field)
+        self._top = {}     # heavy prefix -> its best TOP_CANDIDATES ids, best first
+        self._stale = set()  # heavy prefixes whose list fell below REFILL_BELOW
+        self._touched = None  # Ids changed while a refill runs (None when idle)
+        self._lock = threading.Lock()
+
+    def load(self, rows, id_field: str):
+        """Replaces the whole index with `rows` (dicts with id, name and score)."""
+        items = {row[id_field]: dict(row) for row in rows}
+        keys = sorted((row[self.name_field].lower(), item_id) for item_id, row in items.items())
+        top = self._build_top(keys, items)
+        with self._lock:
+            self._keys, self._items, self._top = keys, items, top
+            self._stale.clear()
+
+    def _build_top(self, keys, items):
+        """Top ids for every prefix matching more than HEAVY_PREFIX_SIZE keys."""
+        top = {}
+        heavy = [("", 0, len(keys))]  # Only sub-ranges of heavy prefixes can be heavy
+        while heavy:
+            longer = []
+            for prefix, lo, hi in heavy:
+                length = len(prefix) + 1
+                i = lo
+                while i < hi:
+                    key = keys[i][0]
+                    if len(key) < length:  # The prefix itself is a whole name
+                        i += 1
+                        continue
+                    j = bisect_left(keys, (key[:length] + "\uffff",), i, hi)
+                    if j - i > HEAVY_PREFIX_SIZE:
+                        top[key[:length]] = self._rank([item_id for _, item_id in keys[i:j]], items, TOP_CANDIDATES)
+                        longer.append((key[:length], i, j))
+                    i = j
+            heavy = longer
+        return top
+
+    def _rank_key(self, item_id, items=None):
+        # Highest score first; ties alphabetical
+        item = (items if items is not None else self._items)[item_id]
+        return (-item[self.score_field], item[self.name_field].lower(), item_id)
+
+    def _rank(self, ids, items, limit: int = MAX_SUGGESTIONS):
+        return heapq.nsmallest(limit, ids, key=lambda i: self._rank_key(i, items))
+
+    def _matching_ids(self, prefix: str):
+        """Ids whose key starts with `prefix` (caller holds the lock)."""
+        lo = bisect_left(self._keys, (prefix,))
+        hi = bisect_left(self._keys, (prefix + "\uffff",))
+        return [item_id for _, item_id in self._keys[lo:hi]]
+
+    def _update_top(self, key: str, item_id, old_rank=None):
+        """
+        Fixes the list of every heavy prefix of `key` after the item was
+        added (old_rank None) or its score changed (caller holds the lock).
+        Only the bounded lists are touched, never the whole prefix range.
+        """
+        new_rank = self._rank_key(item_id)
+        for length in range(1, len(key) + 1):
+            prefix = key[:length]
+            ids = self._top.get(prefix)
+            if ids is None:
+                continue
+            others = [i for i in ids if i != item_id]
+            # Everything off the list ranks no better than the list's last entry did
+            if not ids:
+                bound = None
+            elif ids[-1] == item_id and old_rank is not None:
+                bound = old_rank
+            else:
+                bound = self._rank_key(ids[-1])
+            if bound is not None and new_rank <= bound:
+                ranks = [self._rank_key(i) for i in others]
+                at = bisect_right(ranks, new_rank)
+                others = (others[:at] + [item_id] + others[at:])[:TOP_CANDIDATES]
+            self._set_top(prefix, others)
+
+    def _remove_from_top(self, key: str, item_id):
+        for length in range(1, len(key) + 1):
+            ids = self._top.get(key[:length])
+            if ids is not None and item_id in ids:
+                self._set_top(key[:length], [i for i in ids if i != item_id])
+
+    def _set_top(self, prefix: str, ids):
+        self._top[prefix] = ids
+        if len(ids) < REFILL_BELOW:
+            self._stale.add(prefix)
+
+    def _refill_stale(self):
+        """Starts a background refill if a list ran short (call without the lock)."""
+        with self._lock:
+            if not self._stale or self._touched is not None:
+                return
+            self._touched = set()
+        threading.Thread(target=self._refill, name="echo-typeahead-refill", daemon=True).start()
+
+    def _refill(self):
+        """
+        Re-ranks short prefixes without holding the lock. Items changed
+        meanwhile are taken out of the result and merged back in with their
+        current scores, the same way _update_top handles one change.
+        """
+        try:
+            while True:
+                with self._lock:
+                    if not self._stale:
+                        return
+                    prefix = next(iter(self._stale))
+                    items = self._items
+                    lo = bisect_left(self._keys, (prefix,))
+                    hi = bisect_left(self._keys, (prefix + "\uffff",))
+                    keys = self._keys[lo:hi]  # A shallow slice copy; the ranking happens unlocked
+                    self._touched.clear()
+                ids = self._rank([item_id for _, item_id in keys], items, TOP_CANDIDATES)
+                with self._lock:
+                    if self._items is not items:  # Reloaded meanwhile; load() cleared _stale
+                        continue
+                    ids = [i for i in ids if i not in self._touched]
+                    if ids:
+                        bound = self._rank_key(ids[-1])
+                        for item_id in self._touched:
+                            if (items[item_id][self.name_field].lower().startswith(prefix)
+                                    and self._rank_key(item_id) <= bound):
+                                ids.append(item_id)
+                        ids = sorted(ids, key=self._rank_key)[:TOP_CANDIDATES]
+                    self._top[prefix] = ids
+                    # Still short only if changed items dropped out; then go round again
+                    if len(ids) >= REFILL_BELOW or len(ids) >= len(keys):
+                        self._stale.discard(prefix)
+        finally:
+            with self._lock:
+                self._touched = None
+
+    def upsert(self, item_id, row: dict):
+        """Adds or replaces one item (new user, new tag, renamed item)."""
+        new_key = (row[self.name_field].lower(), item_id)
+        with self._lock:
+            old = self._items.get(item_id)
+            old_key = (old[self.name_field].lower(), item_id) if old is not None else None
+            if old_key is not None and old_key != new_key:
+                del self._keys[bisect_left(self._keys, old_key)]
+                self._remove_from_top(old_key[0], item_id)
+            old_rank = self._rank_key(item_id) if old_key == new_key else None
+            self._items[item_id] = dict(row)
+            if old_key != new_key:
+                insort(self._keys, new_key)
+            self._update_top(new_key[0], item_id, old_rank)
+            if self._touched is not None:
+                self._touched.add(item_id)
+        self._refill_stale()
+
+    def set_score(self, item_id, score: int):
+        with self._lock:
+            item = self._items.get(item_id)
+            if item is None or item[self.score_field] == score:
+                return
+            old_rank = self._rank_key(item_id)
+            item[self.score_field] = score
+            self._update_top(item[self.name_field].lower(), item_id, old_rank)
+            if self._touched is not None:
+                self._touched.add(item_id)
+        self._refill_stale()
+
+    def search(self, prefix: str, limit: int = MAX_SUGGESTIONS):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+        with self._lock:
+            ids = self._top.get(prefix)  # May run short of `limit` until a refill lands
+            if ids is None:
+                ids = self._rank(self._matching_ids(prefix), self._items, limit)
+            return [dict(self._items[item_id]) for item_id in ids[:limit]]
+
+    def __len__(self):
+        return len(self._items)
+
+
+USERS = PrefixIndex("username", "follower_count")
+TAGS = PrefixIndex("name", "post_count")
+
+_state = {"loaded_at": None, "reloading": False, "load_ms": None}
+_state_lock = threading.Lock()
+
+
+def load(conn):
+    """(Re)builds both indexes from the database."""
+    start = time.perf_counter()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(USERS_SQL)
+        USERS.load(cursor.fetchall(), "user_id")
+        cursor.execute(TAGS_SQL)
+        TAGS.load(cursor.fetchall(), "category_id")
+    finally:
+        cursor.close()
+    with _state_lock:
+        _state["loaded_at"] = time.monotonic()
+        _state["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def reload_if_stale(connect):
+    """Starts a background reload when the indexes are older than TYPEAHEAD_RELOAD_SECONDS."""
+    with _state_lock:
+        loaded_at = _state["loaded_at"]
+        if _state["reloading"] or (loaded_at is not None and time.monotonic() - loaded_at < TYPEAHEAD_RELOAD_SECONDS):
+            return
+        _state["reloading"] = True
+
+    def run():
+        conn = None
+        try:
+            conn = connect()
+            if conn is not None:
+                load(conn)
+        except Exception as e:
+            print(f"Error reloading typeahead: {e}")
+        finally:
+            with _state_lock:
+                _state["reloading"] = False
+            if conn is not None and conn.is_connected():
+                conn.close()
+
+    threading.Thread(target=run, name="echo-typeahead-reload", daemon=True).start()
+
+
+def tag_names(categories_csv) -> list:
+    """The tag names in a post's categories string, as sp_create_post splits them."""
+    return [name.strip() for name in (categories_csv or "").split(",") if name.strip()]
+
+
+def suggest(q: str, limit: int = MAX_SUGGESTIONS) -> dict:
+    return {"users": USERS.search(q, limit), "tags": TAGS.search(q, limit)}
+
+
+def stats() -> dict:
+    with _state_lock:
+        loaded_at = _state["loaded_at"]
+        return {
+            "users": len(USERS),
+            "tags": len(TAGS),
+            "age_seconds": round(time.monotonic() - loaded_at, 1) if loaded_at is not None else None,
+            "load_ms": _state["load_ms"],
+        }
@@ -1,5 +1,12 @@
 // This file controls the main "shell" of your application.
 
+// --- 0. API Location ---
+// Pages built by frontend/build_assets.py and served by the API carry an
+// <meta name="echo-api-base"> tag, so calls stay same-origin (no CORS preflight).
+// Opened from a file or a dev server (:5500/:5501), they go to the API on :8000.
+const apiBaseMeta = document.querySelector('meta[name="echo-api-base"]');
+const API_BASE_URL = apiBaseMeta ? apiBaseMeta.content : 'http://127.0.0.1:8000';
+
 // --- 1. Get Auth State ---
 const LOGGED_IN_USER_ID = sessionStorage.getItem('current_user_id');
 const path = window.location.pathname.split('/').pop();
@@ -159,7 +166,7 @@ async function fetchUnreadCount() {
     const badge = document.getElementById('notification-badge');
     if (!badge || !LOGGED_IN_USER_ID) return;
     try {
-        const response = await fetch(`http://127.0.0.1:8000/users/${LOGGED_IN_USER_ID}/notifications/unread-count`);
+        const response = await fetch(`${API_BASE_URL}/users/${LOGGED_IN_USER_ID}/notifications/unread-count`);
         if (!response.ok) return;
         const data = await response.json();
         if (data.unread_count > 0) {
@@ -171,4 +178,176 @@ async function fetchUnreadCount() {
     } catch (error) {
         console.error("Failed to fetch notification count:", error);
     }
-}
\ No newline at end of file
+}
+
+// --- 7. Data Layer ---
+// A small client-side cache shared by every page:
+//  - identical requests that are already in flight share one fetch,
+//  - responses (and the posts inside them) are kept in an LRU cache that is
+//    saved to sessionStorage, so the feed, explore and profile pages reuse
+//    each other's data across navigations,
+//  - cached data is returned at once and revalidated in the background.
+const EchoData = (() => {
+    const STORAGE_KEY = 'echo-data-cache';
+    const MAX_ENTRIES = 300;
+    const FRESH_FOR_MS = 5000;   // Younger than this: no background revalidation
+
+    const entries = new Map();   // key -> { data, fetchedAt }; Map order is LRU order
+    const inFlight = new Map();  // url -> Promise
+
+    // Restore what earlier pages in this tab fetched
+    try {
+        const saved = JSON.parse(sessionStorage.getItem(STORAGE_KEY) || '[]');
+        saved.forEach(([key, entry]) => entries.set(key, entry));
+    } catch (error) {
+        sessionStorage.removeItem(STORAGE_KEY);
+    }
+    window.addEventListener('pagehide', () => {
+        try {
+            sessionStorage.setItem(STORAGE_KEY, JSON.stringify([...entries]));
+        } catch (error) {
+            // Storage full: this page's data just won't carry over
+        }
+    });
+
+    function peekEntry(key) {
+        const entry = entries.get(key);
+        if (!entry) return null;
+        // Move to the most-recently-used end
+        entries.delete(key);
+        entries.set(key, entry);
+        return entry;
+    }
+
+    function store(key, data) {
+        entries.delete(key);
+        entries.set(key, { data, fetchedAt: Date.now() });
+        while (entries.size > MAX_ENTRIES) {
+            entries.delete(entries.keys().next().value);
+        }
+    }
+
+    function rememberPosts(data) {
+        const posts = Array.isArray(data) ? data : (data && data.posts) || [];
+        posts.forEach(post => {
+            if (post && post.post_id !== undefined) {
+                const key = `post:${post.post_id}`;
+                const known = entries.get(key);
+                store(key, known ? { ...known.data, ...post } : post);
+            }
+        });
+    }
+
+    // Fetch with in-flight de-duplication; successful JSON goes into the cache
+    function fetchJSON(url) {
+        if (inFlight.has(url)) return inFlight.get(url);
+        const request = fetch(url)
+            .then(response => {
+                if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
+                return response.json();
+            })
+            .then(data => {
+                store(url, data);
+                rememberPosts(data);
+                return data;
+            })
+            .finally(() => inFlight.delete(url));
+        inFlight.set(url, request);
+        return request;
+    }
+
+    // Cached data right away (revalidated in the background, with onUpdate
+    // called if it changed), otherwise a network fetch.
+    function getJSON(url, { onUpdate } = {}) {
+        const entry = peekEntry(url);
+        if (!entry) return fetchJSON(url);
+        if (Date.now() - entry.fetchedAt > FRESH_FOR_MS) {
+            fetchJSON(url)
+                .then(data => {
+                    if (onUpdate && JSON.stringify(data) !== JSON.stringify(entry.data)) onUpdate(data);
+                })
+                .catch(error => console.error('Background revalidation failed:', error));
+        }
+        return Promise.resolve(entry.data);
+    }
+
+    function prefetch(url) {
+        if (!entries.has(url)) fetchJSON(url).catch(() => {});
+    }
+
+    function peek(url) {
+        const entry = peekEntry(url);
+        return entry ? entry.data : null;
+    }
+
+    function getPost(post_id) {
+        return peek(`post:${post_id}`);
+    }
+
+    function updatePost(post_id, changes) {
+        const post = getPost(post_id);
+        if (post) store(`post:${post_id}`, { ...post, ...changes });
+    }
+
+    // Drops every cached response whose key contains `fragment`
+    function invalidate(fragment) {
+        [...entries.keys()].forEach(key => {
+            if (key.includes(fragment)) entries.delete(key);
+        });
+    }
+
+    // Paged list that loads the next page before the user reaches the end.
+    //   urlForPage(offset, lastItem) -> url, renderPage(items, isFirstPage) -> void
+    //   (lastItem is the last item shown so far, for keyset-paged endpoints)
+    function infiniteList({ container, pageSize = 20, urlForPage, renderPage, onError, prefetchMargin = '800px' }) {
+        let offset = 0;
+        let lastItem = null;
+        let done = false;
+        let loading = false;
+
+        const sentinel = document.createElement('div');
+        sentinel.className = 'infinite-scroll-sentinel h-1';
+        container.after(sentinel);
+
+        async function loadNext() {
+            if (loading || done) return;
+            loading = true;
+            const isFirstPage = offset === 0;
+            try {
+                const items = await getJSON(urlForPage(offset, lastItem), {
+                    // A revalidated first page re-renders the list from the top
+                    onUpdate: isFirstPage ? (fresh) => { if (offset <= pageSize) renderPage(fresh, true); } : undefined,
+                });
+                renderPage(items, isFirstPage);
+                offset += items.length;
+                if (items.length > 0) lastItem = items[items.length - 1];
+                if (items.length < pageSize) {
+                    done = true;
+                } else {
+                    prefetch(urlForPage(offset, lastItem)); // Have the following page ready
+                }
+            } catch (error) {
+                done = true;
+                if (onError) onError(error, isFirstPage);
+            } finally {
+                loading = false;
+            }
+        }
+
+        const observer = new IntersectionObserver(entriesSeen => {
+            if (entriesSeen.some(entry => entry.isIntersecting)) loadNext();
+        }, { rootMargin: prefetchMargin });
+
+        loadNext().then(() => observer.observe(sentinel));
+
+        return {
+            stop() {
+                done = true;
+                observer.disconnect();
+                sentinel.remove();
+            },
+        };
+    }
+
+    return { getJSON, prefetch, peek, getPost, updatePost, invalidate, rememberPosts, infiniteList };
+})();
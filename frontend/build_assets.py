@@ -0,0 +1,129 @@
+# frontend/build_assets.py
+"""
+Builds the frontend into dist/ so the API can serve it same-origin.
+
+- app-shell.js + post-actions.js are joined into one shared bundle.
+- Each page's inline <script> is moved into its own file.
+- Every script is named by a hash of its content (app.3f9c2a1b.js), so
+  it can be cached forever, and gets .gz and .br (if `brotli` is
+  installed) siblings.
+- Pages get <meta name="echo-api-base" content=""> so app-shell.js
+  calls the API on the same origin.
+
+Run from anywhere:
+    python frontend/build_assets.py
+"""
+import gzip
+import hashlib
+import json
+import re
+import shutil
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # Optional: .br files are skipped without it
+    brotli = None
+
+SRC_DIR = Path(__file__).resolve().parent
+DIST_DIR = SRC_DIR / "dist"
+ASSETS_DIR = DIST_DIR / "assets"
+
+PAGES = [
+    "index.html", "explore.html", "profile.html", "create-post.html",
+    "notifications.html", "login.html", "signup.html",
+]
+# Shared bundle name -> source files, in load order
+BUNDLES = {
+    "app": ["app-shell.js", "post-actions.js"],
+}
+
+INLINE_SCRIPT_RE = re.compile(r"<script>(.*?)</script>", re.DOTALL)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def write_asset(name: str, data: bytes) -> str:
+    """Writes a hashed asset plus precompressed copies; returns its file name."""
+    stem, ext = name.rsplit(".", 1)
+    hashed_name = f"{stem}.{content_hash(data)}.{ext}"
+    path = ASSETS_DIR / hashed_name
+    path.write_bytes(data)
+    path.with_name(hashed_name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(hashed_name + ".br").write_bytes(brotli.compress(data, quality=11))
+    return hashed_name
+
+
+def build_bundles() -> dict:
+    """Returns {source file name: hashed bundle name} for every bundled source."""
+    sources = {}
+    for bundle, files in BUNDLES.items():
+        parts = [f"// --- {name} ---\n" + (SRC_DIR / name).read_text(encoding="utf-8") for name in files]
+        hashed = write_asset(f"{bundle}.js", "\n;\n".join(parts).encode("utf-8"))
+        for name in files:
+            sources[name] = hashed
+    return sources
+
+
+def build_page(page: str, bundled: dict) -> dict:
+    """Rewrites one page into dist/ and returns the assets it references."""
+    html = (SRC_DIR / page).read_text(encoding="utf-8")
+    used = []
+
+    # 1. Shared sources -> one tag for their bundle (where the first one was loaded)
+    for name, hashed in bundled.items():
+        tag = f'<script src="{name}"></script>'
+        if tag not in html:
+            continue
+        if hashed in used:
+            html = re.sub(r"[ \t]*" + re.escape(tag) + r"\n?", "", html)
+        else:
+            html = html.replace(tag, f'<script src="/assets/{hashed}"></script>', 1)
+            used.append(hashed)
+
+    # 2. Inline page scripts -> their own hashed files
+    page_stem = page.rsplit(".", 1)[0]
+    inline_count = 0
+
+    def extract(match):
+        nonlocal inline_count
+        inline_count += 1
+        suffix = f"-{inline_count}" if inline_count > 1 else ""
+        hashed = write_asset(f"{page_stem}{suffix}.js", match.group(1).strip().encode("utf-8") + b"\n")
+        used.append(hashed)
+        return f'<script src="/assets/{hashed}"></script>'
+
+    html = INLINE_SCRIPT_RE.sub(extract, html)
+
+    # 3. Same-origin API calls
+    html = html.replace("<head>", '<head>\n    <meta name="echo-api-base" content="">', 1)
+
+    data = html.encode("utf-8")
+    (DIST_DIR / page).write_bytes(data)
+    (DIST_DIR / (page + ".gz")).write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        (DIST_DIR / (page + ".br")).write_bytes(brotli.compress(data, quality=11))
+    return {"assets": used}
+
+
+def main():
+    if DIST_DIR.exists():
+        shutil.rmtree(DIST_DIR)
+    ASSETS_DIR.mkdir(parents=True)
+
+    bundled = build_bundles()
+    manifest = {"bundles": sorted(set(bundled.values())), "pages": {}}
+    for page in PAGES:
+        manifest["pages"][page] = build_page(page, bundled)
+
+    (DIST_DIR / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    if brotli is None:
+        print("brotli not installed; wrote gzip copies only.")
+    print(f"Built {len(PAGES)} pages into {DIST_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+// This file holds the post detail view, like/comment/delete actions and the
+// bookmark modal shared by index.html and explore.html.
+// It needs app-shell.js (API_BASE_URL, LOGGED_IN_USER_ID) to be loaded first.
+
+// --- 1. Page Hooks ---
+// Each page tells us where the detail view goes and what "back" means.
+const postActionOptions = {
+    detailContainer: null,   // Element the post detail is rendered into
+    backLabel: 'Back',
+    onBack: () => {},        // Called by the detail view's back button
+    onDeleted: () => {},     // Called after the viewer deletes a post
+};
+
+function initPostActions(options) {
+    Object.assign(postActionOptions, options);
+}
+
+function showLoginAlert() {
+    if (confirm("Please log in or create an account to do that.\n\nGo to the login page?")) {
+        window.location.href = 'login.html';
+    }
+}
+
+window.postDetailBack = function() {
+    currentDetailPostId = null;
+    postActionOptions.onBack();
+}
+
+// --- 2. Post Detail View ---
+function displayPostDetails(post, comments) {
+    const postDate = new Date(post.created_at).toLocaleDateString('en-US', { year: 'numeric', month: 'long', day: 'numeric' });
+    const isLiked = post.is_liked_by_user;
+    const likeIconClass = isLiked ? 'fas fa-heart text-red-500' : 'far fa-heart';
+    const likeButtonClass = isLiked ? 'text-red-500' : 'hover:text-red-500';
+    const username = post.username || 'Unknown';
+
+    // Build Tags HTML
+    let tagsHTML = '';
+    if (post.categories) {
+        const tags = post.categories.split(',');
+        tags.forEach(tag => {
+            tagsHTML += `<a href="explore.html?q=${encodeURIComponent(tag)}" class="tag">#${tag}</a>`;
+        });
+    }
+
+    let postHTML = `
+        <div>
+            <div class="flex justify-between items-center mb-6">
+                <button onclick="postDetailBack()" class="text-emerald-600 hover:text-emerald-800 font-medium">
+                    <i class="fas fa-arrow-left mr-2"></i> ${postActionOptions.backLabel}
+                </button>
+                ${LOGGED_IN_USER_ID && post.user_id == LOGGED_IN_USER_ID ? `
+                    <button onclick="handleDeletePost(${post.post_id}, '${post.title.replace(/'/g, "\\'")}')"
+                            class="px-4 py-2 rounded-lg bg-red-50 text-red-700 font-semibold hover:bg-red-100">
+                        <i class="fas fa-trash-alt mr-2"></i> Delete Post
+                    </button>
+                ` : ''}
+            </div>
+            <div class="flex items-center mb-4">
+                <div class="bg-gray-100 h-11 w-11 rounded-full flex items-center justify-center font-bold text-emerald-500 text-lg">
+                    ${username.charAt(0).toUpperCase()}
+                </div>
+                <div class="ml-4">
+                    <a href="profile.html?user_id=${post.user_id}" class="font-semibold text-gray-900 hover:text-emerald-600">${username}</a>
+                    <p class="text-sm text-gray-500">${postDate}</p>
+                </div>
+            </div>
+            <h1 class="text-4xl font-extrabold text-gray-900 leading-tight mb-4">${post.title}</h1>
+            <div class="mt-2 flex flex-wrap">${tagsHTML}</div>
+            <div class="text-gray-700 text-lg leading-relaxed space-y-4 mt-4">
+                <p>${post.content.replace(/\n/g, '<br>')}</p>
+            </div>
+            <div class="mt-8 flex items-center text-gray-500 text-sm space-x-6 border-t border-b border-gray-200 py-4">
+                <button onclick="toggleLike(${post.post_id}, this, true)"
+                        class="flex items-center transition-colors duration-300 ${likeButtonClass}">
+                    <i class="${likeIconClass} mr-2"></i>
+                    <span class="like-count">${post.likes_count}</span>&nbsp;Likes
+                </button>
+                <div class="flex items-center">
+                    <i class="far fa-comment-dots mr-2"></i> ${post.comments_count || 0} Comments
+                </div>
+                <div class="flex items-center">
+                    <i class="far fa-eye mr-2"></i> ${post.views_count} Views
+                </div>
+                <div class="flex-1 flex justify-end">
+                    <button onclick="openBookmarkModal(${post.post_id})"
+                            class="flex items-center hover:text-emerald-600 transition-colors duration-300">
+                        <i class="far fa-bookmark text-lg"></i>
+                    </button>
+                </div>
+            </div>
+        </div>
+    `;
+
+    // Add Comment Form (or a nudge to log in)
+    if (LOGGED_IN_USER_ID) {
+        postHTML += `
+            <div class="mt-8">
+                <h3 class="text-xl font-bold mb-4">Add a Comment</h3>
+                <form onsubmit="handleCommentSubmit(event, ${post.post_id})">
+                    <textarea id="comment-content" class="w-full p-3 border border-gray-300 rounded-lg" rows="4" placeholder="Write your thoughts..." required></textarea>
+                    <button type="submit" class="mt-3 bg-emerald-500 text-white font-semibold px-5 py-2 rounded-lg hover:bg-emerald-600 transition-colors">
+                        Post Comment
+                    </button>
+                </form>
+            </div>
+        `;
+    } else {
+        postHTML += `
+            <div class="mt-8 text-center p-4 bg-gray-50 rounded-lg">
+                <p class="text-gray-600">
+                    <a href="login.html" class="font-bold text-emerald-600 hover:underline">Log in</a> or
+                    <a href="signup.html" class="font-bold text-emerald-600 hover:underline">sign up</a> to leave a comment.
+                </p>
+            </div>
+        `;
+    }
+
+    // Add Comments List
+    postHTML += `<div id="comments-list" class="mt-8 space-y-6">`;
+    if (comments.length === 0) {
+        postHTML += `<p class="text-gray-500">No comments yet.</p>`;
+    } else {
+        comments.forEach(comment => {
+            const commentDate = new Date(comment.created_at).toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
+            postHTML += `
+                <div class="flex">
+                    <div class="flex-shrink-0 bg-gray-100 h-10 w-10 rounded-full flex items-center justify-center font-bold text-gray-500 text-md">
+                        ${comment.username.charAt(0).toUpperCase()}
+                    </div>
+                    <div class="ml-4">
+                        <p class="font-semibold text-gray-900">
+                            <a href="profile.html?user_id=${comment.user_id}" class="hover:text-emerald-600">${comment.username}</a>
+                            <span class="text-sm text-gray-500 font-normal ml-2">${commentDate}</span>
+                        </p>
+                        <p class="text-gray-700 mt-1">${comment.content}</p>
+                    </div>
+                </div>
+            `;
+        });
+    }
+    postHTML += `</div>`;
+
+    postActionOptions.detailContainer.innerHTML = postHTML;
+}
+
+// Shows a post, straight from the shared cache (EchoData in app-shell.js)
+// when the feed, explore or profile page already fetched it, then refreshes it.
+let currentDetailPostId = null;
+
+async function loadPostDetails(post_id) {
+    const container = postActionOptions.detailContainer;
+    const commentsUrl = `${API_BASE_URL}/posts/${post_id}/comments`;
+    currentDetailPostId = String(post_id);
+    const stillShowing = () => currentDetailPostId === String(post_id);
+
+    const cachedPost = EchoData.getPost(post_id);
+    const cachedComments = EchoData.peek(commentsUrl);
+    if (cachedPost && cachedComments) {
+        displayPostDetails(cachedPost, cachedComments);
+    } else {
+        container.innerHTML = `<div class="text-center py-20"><i class="fas fa-spinner fa-spin fa-3x text-gray-400"></i></div>`;
+    }
+
+    try {
+        // The detail call records a view and the viewer's like state, so it always goes to the API
+        const safe_user_id = LOGGED_IN_USER_ID || 0; // Pass 0 if logged out
+        const [postRes, comments] = await Promise.all([
+            fetch(`${API_BASE_URL}/posts/${post_id}?user_id=${safe_user_id}`),
+            EchoData.getJSON(commentsUrl, {
+                onUpdate: (fresh) => { if (stillShowing()) displayPostDetails(EchoData.getPost(post_id), fresh); },
+            }),
+        ]);
+        if (!postRes.ok) throw new Error('Failed to load post details');
+        const post = (await postRes.json())[0];
+        EchoData.rememberPosts([post]);
+        if (stillShowing()) displayPostDetails(post, comments);
+    } catch (error) {
+        console.error("Failed to fetch post details:", error);
+        if (stillShowing()) container.innerHTML = `<p class="text-red-500">Error loading post.</p>`;
+    }
+}
+
+// --- 3. Core Action Functions (with Auth Guards) ---
+window.toggleLike = async function(post_id, buttonElement, isDetailPage) {
+    if (!LOGGED_IN_USER_ID) { showLoginAlert(); return; }
+    try {
+        const response = await fetch(`${API_BASE_URL}/posts/${post_id}/like`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ user_id: LOGGED_IN_USER_ID }) });
+        if (!response.ok) throw new Error('Like request failed');
+        const result = await response.json();
+        const likeState = result[0];
+        const countSpan = buttonElement.querySelector('.like-count');
+        countSpan.textContent = likeState.new_count;
+        EchoData.updatePost(post_id, { likes_count: likeState.new_count, is_liked_by_user: likeState.liked });
+        if (isDetailPage) {
+            const icon = buttonElement.querySelector('i');
+            if (likeState.liked) { icon.className = 'fas fa-heart mr-2'; buttonElement.classList.add('text-red-500'); }
+            else { icon.className = 'far fa-heart mr-2'; buttonElement.classList.remove('text-red-500'); }
+        }
+    } catch (error) { console.error("Failed to toggle like:", error); }
+}
+
+window.handleCommentSubmit = async function(event, post_id) {
+    event.preventDefault();
+    if (!LOGGED_IN_USER_ID) { showLoginAlert(); return; }
+    const contentElement = document.getElementById('comment-content');
+    const content = contentElement.value;
+    if (!content) return;
+    try {
+        const response = await fetch(`${API_BASE_URL}/posts/${post_id}/comments`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ user_id: LOGGED_IN_USER_ID, content: content }) });
+        if (!response.ok) throw new Error('Failed to post comment');
+        contentElement.value = '';
+        EchoData.invalidate(`/posts/${post_id}/comments`);
+        showPostDetails(post_id);
+    } catch (error) { console.error("Failed to post comment:", error); }
+}
+
+window.handleDeletePost = async function(post_id, post_title) {
+    if (!LOGGED_IN_USER_ID) { showLoginAlert(); return; }
+    if (!confirm(`Are you sure you want to delete this post?\n\n"${post_title}"`)) return;
+    try {
+        const response = await fetch(`${API_BASE_URL}/posts/${post_id}`, {
+            method: 'DELETE',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ user_id: LOGGED_IN_USER_ID })
+        });
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'Failed to delete post');
+        }
+        alert('Post deleted successfully.');
+        // Every cached list may contain it
+        EchoData.invalidate('/posts');
+        EchoData.invalidate('/feed');
+        EchoData.invalidate(`post:${post_id}`);
+        postActionOptions.onDeleted();
+    } catch (error) {
+        console.error('Error deleting post:', error);
+        alert(`Error: ${error.message}`);
+    }
+}
+
+// --- 4. Bookmark Modal Functions (with Auth Guards) ---
+let currentPostIdToBookmark = null;
+let initialBookmarkedIds = new Set();
+
+window.openBookmarkModal = function(post_id) {
+    if (!LOGGED_IN_USER_ID) { showLoginAlert(); return; }
+    currentPostIdToBookmark = post_id;
+    document.getElementById('collections-list').innerHTML = '';
+    document.getElementById('collections-loading').style.display = 'block';
+    document.getElementById('bookmark-modal').classList.remove('hidden');
+    document.body.classList.add('modal-open');
+    fetchCollectionsAndStatus();
+}
+
+window.closeBookmarkModal = function() {
+    document.getElementById('bookmark-modal').classList.add('hidden');
+    document.body.classList.remove('modal-open');
+    currentPostIdToBookmark = null;
+    initialBookmarkedIds.clear();
+}
+
+async function fetchCollectionsAndStatus() {
+    const collectionsList = document.getElementById('collections-list');
+    try {
+        const [collectionsRes, statusRes] = await Promise.all([
+            fetch(`${API_BASE_URL}/users/${LOGGED_IN_USER_ID}/collections`),
+            fetch(`${API_BASE_URL}/posts/${currentPostIdToBookmark}/bookmark-status?user_id=${LOGGED_IN_USER_ID}`)
+        ]);
+        if (!collectionsRes.ok || !statusRes.ok) throw new Error('Failed to load collections');
+        const collections = await collectionsRes.json();
+        const bookmarkedInIds = await statusRes.json();
+        initialBookmarkedIds = new Set(bookmarkedInIds);
+        renderCollectionsList(collections);
+    } catch (error) {
+        console.error(error);
+        collectionsList.innerHTML = `<p class="text-red-500">Could not load collections.</p>`;
+    } finally {
+        document.getElementById('collections-loading').style.display = 'none';
+    }
+}
+
+function renderCollectionsList(collections) {
+    const collectionsList = document.getElementById('collections-list');
+    collectionsList.innerHTML = '';
+    if (collections.length === 0) {
+        collectionsList.innerHTML = `<p class="text-gray-500 text-center">No collections yet.</p>`;
+    }
+    collections.forEach(collection => {
+        const isChecked = initialBookmarkedIds.has(collection.collection_id);
+        const li = document.createElement('li');
+        li.innerHTML = `
+            <label>
+                <input type="checkbox" data-collection-id="${collection.collection_id}" ${isChecked ? 'checked' : ''}>
+                <span class="font-medium">${collection.name}</span>
+                <span class="ml-auto text-sm text-gray-500">${collection.post_count} posts</span>
+            </label>
+        `;
+        collectionsList.appendChild(li);
+    });
+}
+
+function addBookmark(collectionId) {
+    return fetch(`${API_BASE_URL}/bookmarks/`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ user_id: LOGGED_IN_USER_ID, post_id: currentPostIdToBookmark, collection_id: collectionId })
+    });
+}
+
+function removeBookmark(collectionId) {
+    const params = new URLSearchParams({ user_id: LOGGED_IN_USER_ID, post_id: currentPostIdToBookmark, collection_id: collectionId });
+    return fetch(`${API_BASE_URL}/bookmarks/?${params}`, { method: 'DELETE' });
+}
+
+async function handleSaveBookmarks() {
+    const saveBookmarksBtn = document.getElementById('save-bookmarks-btn');
+    saveBookmarksBtn.disabled = true;
+    saveBookmarksBtn.textContent = 'Saving...';
+    const promises = [];
+    const checkboxes = document.getElementById('collections-list').querySelectorAll('input[type="checkbox"]');
+    checkboxes.forEach(checkbox => {
+        const collectionId = parseFloat(checkbox.dataset.collectionId);
+        const isChecked = checkbox.checked;
+        const wasChecked = initialBookmarkedIds.has(collectionId);
+        if (isChecked && !wasChecked) { promises.push(addBookmark(collectionId)); }
+        else if (!isChecked && wasChecked) { promises.push(removeBookmark(collectionId)); }
+    });
+    try {
+        await Promise.all(promises);
+    } catch (error) {
+        console.error("Failed to save bookmarks:", error);
+        alert("An error occurred while saving. Please try again.");
+    } finally {
+        saveBookmarksBtn.disabled = false;
+        saveBookmarksBtn.textContent = 'Save';
+        closeBookmarkModal();
+    }
+}
+
+// --- 5. Wire up the modal (only on pages that have one) ---
+document.addEventListener('DOMContentLoaded', () => {
+    const createCollectionForm = document.getElementById('create-collection-form');
+    const saveBookmarksBtn = document.getElementById('save-bookmarks-btn');
+    if (!createCollectionForm || !saveBookmarksBtn) return;
+
+    createCollectionForm.addEventListener('submit', async (e) => {
+        e.preventDefault();
+        const newCollectionNameInput = document.getElementById('new-collection-name');
+        const newName = newCollectionNameInput.value;
+        if (!newName) return;
+        try {
+            const response = await fetch(`${API_BASE_URL}/collections/`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ name: newName, user_id: LOGGED_IN_USER_ID })
+            });
+            if (!response.ok) throw new Error('Failed to create collection');
+            newCollectionNameInput.value = '';
+            fetchCollectionsAndStatus(); // Refresh list to show new collection
+        } catch (error) {
+            console.error(error);
+            alert(error.message);
+        }
+    });
+
+    saveBookmarksBtn.addEventListener('click', handleSaveBookmarks);
+});